@@ -2,7 +2,6 @@ import base64
 import pickle
 import time
 import cv2
-import torch
 import numpy as np
 import matplotlib.pyplot as plt
 from PyQt5.QtCore import QObject, QThread, pyqtSlot
@@ -10,7 +9,14 @@ from PyQt5.QtWidgets import QApplication
 
 from models import FaceDetection
 from models import UserRepository, AttendanceRepository
-from core import DETECTION_THRESHOLD
+from models.gallery import (
+    build_gallery,
+    create_compressed_gallery,
+    create_sharded_gallery,
+    rank_candidates,
+    unambiguous_match,
+)
+from core import DETECTION_THRESHOLD, metrics
 from thread import VideoCaptureThread
 
 
@@ -23,6 +29,10 @@ class FaceRecognitionController(QObject):
         self.repository = UserRepository(ctx)
         self.attendance_repostiory = AttendanceRepository(ctx)
         self.user_list = self.attendance_repostiory.get_users_not_present_today()
+        # Kept across check-ins, shard workers are expensive to start and
+        # compressing the gallery decodes every user
+        self.sharded_gallery = create_sharded_gallery()
+        self.compressed_gallery = create_compressed_gallery()
 
         self.video_thread = None
         self.current_frame = None
@@ -76,11 +86,12 @@ class FaceRecognitionController(QObject):
 
     def detect_user_by_face(self, image_path=None):
         """Detects users by comparing face embeddings."""
+        check_in_start = time.perf_counter()
         if image_path:
-            frame = cv2.imread(image_path)
-            if frame is None:
+            result = self.f_detector.detect_faces_in_file(image_path)
+            if result is None:
                 raise Exception("Error: Could not read image from the provided path.")
-            _, encoded_face = self.f_detector.detect_faces(frame)
+            _, encoded_face = result
         else:
             self._open_camera()
             try:
@@ -88,33 +99,51 @@ class FaceRecognitionController(QObject):
             finally:
                 self.release()
 
-        user_list = self.repository.get_all()
+        with metrics.timed("db_load_users"):
+            user_list = self.repository.get_all()
         result = []
 
-        for user in user_list:
-            decoded_embedding = self.decode_embedding(user.face_embedding)
-            match = False
-            if (
-                isinstance(decoded_embedding, list)
-                and len(decoded_embedding) > 0
-                and len(encoded_face) > 0
-                and isinstance(decoded_embedding[0], torch.Tensor)
-            ):
-                match, sim = self.f_detector.match_face(
-                    decoded_embedding[0], encoded_face[0], threshold=DETECTION_THRESHOLD
-                )
-                if match:
-                    self.attendance_repostiory.mark_attendance(user.id, True)
-                    result.append(user.user_name)
+        match = self.best_match(user_list, encoded_face)
+        if match is not None:
+            user_id, user_name, _ = match
+            with metrics.timed("db_mark_attendance"):
+                self.attendance_repostiory.mark_attendance(user_id, True)
+            metrics.increment("attendance_marked")
+            result.append(user_name)
 
+        metrics.observe("check_in", time.perf_counter() - check_in_start)
         return result
 
+    def best_match(self, user_list, encoded_face):
+        """
+        Identify the first face among the users.
+
+        Returns:
+        - match: (user_id, user_name, similarity) of the best candidate if it
+          exceeds the threshold and leads the second one by the configured
+          margin, else None.
+        """
+        if len(encoded_face) == 0 or encoded_face[0] is None:
+            return None
+
+        gallery = build_gallery(
+            user_list, self.sharded_gallery, self.compressed_gallery
+        )
+        with metrics.timed("match"):
+            ranking = rank_candidates(gallery, encoded_face[:1])[0]
+        match = unambiguous_match(ranking, threshold=DETECTION_THRESHOLD)
+        if match is None:
+            return None
+        index, similarity = match
+        return gallery.user_ids[index], gallery.user_names[index], similarity
+
     def authorize_face(self, image_path=None):
+        check_in_start = time.perf_counter()
         if image_path:
-            frame = cv2.imread(image_path)
-            if frame is None:
+            result = self.f_detector.detect_faces_in_file(image_path)
+            if result is None:
                 raise Exception("Error: Could not read image from the provided path.")
-            _, encoded_face = self.f_detector.detect_faces(frame)
+            _, encoded_face = result
         else:
 
             app = QApplication.instance()
@@ -157,25 +186,19 @@ class FaceRecognitionController(QObject):
 
         user_list = []
 
-        self.user_list = self.attendance_repostiory.get_users_not_present_today()
-        for user in self.user_list:
-            decoded_embedding = self.decode_embedding(user.face_embedding)
-            match = False
-            if (
-                isinstance(decoded_embedding, list)
-                and len(decoded_embedding) > 0
-                and len(encoded_face) > 0
-                and isinstance(decoded_embedding[0], torch.Tensor)
-            ):
-                match, _ = self.f_detector.match_face(
-                    decoded_embedding[0], encoded_face[0], threshold=DETECTION_THRESHOLD
-                )
-                if match:
-                    print("INFO: match found with user: ", user.user_name)
-                    self.attendance_repostiory.mark_attendance(user.id, True)
-                    self.user_list.remove(user)
-                    user_list.append(user.user_name)
-
+        with metrics.timed("db_load_users"):
+            self.user_list = self.attendance_repostiory.get_users_not_present_today()
+        match = self.best_match(self.user_list, encoded_face)
+        if match is not None:
+            user_id, user_name, _ = match
+            print("INFO: match found with user: ", user_name)
+            with metrics.timed("db_mark_attendance"):
+                self.attendance_repostiory.mark_attendance(user_id, True)
+            metrics.increment("attendance_marked")
+            self.user_list = [user for user in self.user_list if user.id != user_id]
+            user_list.append(user_name)
+
+        metrics.observe("check_in", time.perf_counter() - check_in_start)
         return user_list
 
     def release(self):
@@ -189,3 +212,11 @@ class FaceRecognitionController(QObject):
     def get_users_preset_today(self):
         """Get the list of users who are present today."""
         return self.attendance_repostiory.get_users_present_today()
+
+    def subscribe_attendance(self, callback):
+        """Register a callback fired whenever attendance is marked."""
+        self.attendance_repostiory.subscribe(callback)
+
+    def unsubscribe_attendance(self, callback):
+        """Remove a callback registered with `subscribe_attendance`."""
+        self.attendance_repostiory.unsubscribe(callback)
@@ -1,14 +1,12 @@
-import base64
-import pickle
 import time
 import cv2
 from PyQt5.QtCore import pyqtSlot, QObject, QThread
 from PyQt5.QtWidgets import QApplication
 
 from thread import VideoCaptureThread
-from models import FaceDetection, UserRepository
+from models import FaceDetection, Users, UserRepository
 from cv_models import FaceEncoder
-from core import DEBUG
+from core import DEBUG, metrics
 
 
 class FaceRegistrationController(QObject):
@@ -16,7 +14,9 @@ class FaceRegistrationController(QObject):
         super().__init__()
         self.ctx = ctx
         self.repository = UserRepository(ctx)
-        self.f_detector = FaceDetection()
+        # Registration photos are not quality gated, enrolment keeps accepting
+        # the faces it accepted before the gate existed
+        self.f_detector = FaceDetection(quality_gate=False)
         self.encoder = FaceEncoder()
 
         # Implement separate video thread
@@ -36,7 +36,7 @@ class FaceRegistrationController(QObject):
 
     def encode_embedding(self, embedding) -> str:
         """Convert numpy array to a string for database storage."""
-        return base64.b64encode(pickle.dumps(embedding)).decode("utf-8")
+        return Users.encode_embedding(embedding)
 
     def add_user(self, user_name: str, face_embedding):
         """Adds or updates a user in the database with their face embedding."""
@@ -45,17 +45,19 @@ class FaceRegistrationController(QObject):
         if users is not None:
             raise Exception("User already exists")
         try:
-            self.repository.add_user(user_name, encoded_embedding)
+            with metrics.timed("db_add_user"):
+                self.repository.add_user(user_name, encoded_embedding)
         except Exception as e:
             raise Exception(f"Failed to add user: {e}")
+        metrics.increment("users_registered")
 
     def get_embedding(self, image_path=None):
         """Get face embedding from the camera feed or a given image path."""
         if image_path:
-            frame = cv2.imread(image_path)
-            if frame is None:
+            result = self.f_detector.detect_faces_in_file(image_path)
+            if result is None:
                 raise Exception(f"Failed to read image from path: {image_path}")
-            frame, embedding = self.f_detector.detect_faces(frame)
+            frame, embedding = result
         else:
             # Using this for CLI mode to run the thread
             app = QApplication.instance()
@@ -1,13 +1,20 @@
 from .db import Database
 from .app_context import AppContext
+from .async_db import AsyncDatabase
 from .config import *
-
+from .metrics import metrics, start_metrics_export
+from .runtime import apply_runtime_config, pin_thread
 
 __all__ = [
     "Database",
     "AppContext",
+    "AsyncDatabase",
     "DB_PATH",
     "WINDOW_WIDTH",
     "WINDOW_HEIGHT",
     "DEBUG",
+    "metrics",
+    "start_metrics_export",
+    "apply_runtime_config",
+    "pin_thread",
 ]
@@ -0,0 +1,32 @@
+from .config import DB_PATH
+
+
+class AsyncDatabase:
+    def __init__(self, db_path=None):
+        """
+        Async SQLAlchemy engine on the same SQLite file as `Database`, using
+        the aiosqlite driver so queries do not block the event loop.
+
+        The tables are created by `Database`, create the AppContext first.
+
+        Parameters:
+        - db_path: SQLite file, defaults to DB_PATH.
+        """
+        # Imported here so only async users need aiosqlite
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        self.db_path = db_path or DB_PATH
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{self.db_path}", echo=False
+        )
+        # Records stay usable after commit, e.g. to publish them to listeners
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def get_session(self):
+        """Return a new AsyncSession, to be used with `async with`."""
+        return self.Session()
+
+    async def close_connection(self):
+        """Dispose of the engine and its pooled connections."""
+        await self.engine.dispose()
+        print("INFO: Async database connection closed.")
@@ -28,3 +28,104 @@ TEST_DATA_LOCATION = "../test_images"
 
 # Detection threshold
 DETECTION_THRESHOLD = 0.7
+# Candidates ranked per face, and the similarity lead the best one needs over
+# the second to be accepted (attendance is only marked for a clear winner)
+IDENTIFICATION_TOP_K = 5
+IDENTIFICATION_MIN_MARGIN = 0.05
+
+# Gallery compression (PCA projection + int8 quantization)
+GALLERY_COMPRESSION = False
+GALLERY_PCA_COMPONENTS = 128
+GALLERY_SHORTLIST = 16
+GALLERY_EXACT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../../database/", "gallery_exact.npy"
+)
+# Worker processes the gallery is partitioned across, each searching its
+# shard; 0 disables sharding. Only galleries of at least
+# GALLERY_SHARD_MIN_USERS users are sharded, smaller ones are faster in-process
+GALLERY_SHARDS = 0
+GALLERY_SHARD_MIN_USERS = 50000
+
+# Face tracking (reuse recognized identities across preview frames)
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_MISSED = 5
+TRACK_REVERIFY_FRAMES = 30
+TRACK_CONFIDENT_SIMILARITY = 0.8
+
+# Face quality gate (drop faces that will never match before encoding)
+QUALITY_GATE_ENABLED = True
+QUALITY_MIN_FACE_SIZE = 40
+QUALITY_MIN_CONFIDENCE = 0.95
+QUALITY_MIN_SHARPNESS = 100.0
+QUALITY_MAX_ROLL_DEGREES = 30.0
+QUALITY_MAX_YAW_RATIO = 0.35
+
+# Camera loop motion gate and idle duty-cycling
+MOTION_GATE_ENABLED = True
+MOTION_DOWNSCALE_WIDTH = 64
+MOTION_PIXEL_THRESHOLD = 25
+MOTION_MIN_AREA_RATIO = 0.01
+MOTION_LEARNING_RATE = 0.05
+IDLE_AFTER_SECONDS = 10
+ACTIVE_FRAME_INTERVAL_MS = 50
+IDLE_FRAME_INTERVAL_MS = 500
+
+# Pipeline metrics (per-stage latency histograms and event counters)
+METRICS_ENABLED = True
+METRICS_WINDOW = 1024
+# Port of the Prometheus `/metrics` endpoint, None to disable it
+METRICS_HTTP_PORT = None
+# JSON file the metrics are dumped to periodically, None to disable it
+METRICS_DUMP_PATH = None
+METRICS_DUMP_INTERVAL_SECONDS = 60
+
+# Threshold calibration
+CALIBRATION_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../../database/", "calibration.npz"
+)
+# Highest false accept rate allowed at the recommended threshold
+CALIBRATION_TARGET_FAR = 0.001
+
+# Persistent cache of the faces and embeddings of image files
+FACE_CACHE_ENABLED = True
+FACE_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "../../database/", "face_cache.db"
+)
+FACE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Region-of-interest detection for the camera: search around the previous
+# faces first, with a margin of ROI_EXPAND times the face size on each side,
+# and scan the whole frame on a miss or every ROI_FULL_SCAN_INTERVAL frames
+ROI_DETECTION_ENABLED = False
+ROI_EXPAND = 0.5
+ROI_FULL_SCAN_INTERVAL = 15
+
+# Async recognition service: threads running inference, each with its own
+# models, and recognition requests admitted to them at once (others wait)
+ASYNC_INFERENCE_WORKERS = 1
+ASYNC_MAX_PENDING = 16
+
+# Face detector backend: "mtcnn" (TensorFlow) or "torch" (facenet-pytorch,
+# no TensorFlow needed, shares the PyTorch thread pool with the encoder)
+FACE_DETECTOR_BACKEND = "mtcnn"
+
+# Detection and encoding in worker processes for the camera loop, 0 runs
+# them in the capture thread
+DETECTION_WORKERS = 0
+# Shared memory frame buffers, i.e. frames in flight to the workers
+DETECTION_POOL_SLOTS = 4
+
+# CPU thread budget shared by TensorFlow (MTCNN), PyTorch (encoder) and
+# OpenCV. None for the budget uses every usable core; None for a library
+# gives it half of the budget, since detection and encoding run in turn
+CPU_THREAD_BUDGET = None
+TF_INTRA_OP_THREADS = None
+TF_INTER_OP_THREADS = 1
+TORCH_INTRA_OP_THREADS = None
+TORCH_INTER_OP_THREADS = 1
+OPENCV_THREADS = 1
+# Cores each pipeline stage runs on, e.g. {"capture": [0], "detection": [1, 2, 3],
+# "encoding": [4, 5, 6, 7]}. None leaves a stage on every core (Linux only).
+# Threads are pinned once when they start; a thread or detection worker that
+# runs several stages gets the union of their cores
+CPU_AFFINITY = {"capture": None, "detection": None, "encoding": None}
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .config import (
+    METRICS_ENABLED,
+    METRICS_WINDOW,
+    METRICS_HTTP_PORT,
+    METRICS_DUMP_PATH,
+    METRICS_DUMP_INTERVAL_SECONDS,
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    def __init__(self, window: int):
+        """
+        Latency samples of one stage.
+
+        Percentiles are computed over the last `window` samples only, while the
+        count and sum cover every observation since startup.
+        """
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        """Count, sum and nearest-rank quantiles of the window, in seconds."""
+        ordered = sorted(self.samples)
+        summary = {"count": self.count, "sum": self.total}
+        for q in QUANTILES:
+            if ordered:
+                index = min(len(ordered) - 1, int(q * len(ordered)))
+                summary[f"p{round(q * 100)}"] = ordered[index]
+            else:
+                summary[f"p{round(q * 100)}"] = None
+        return summary
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=METRICS_ENABLED, window=METRICS_WINDOW):
+        """
+        Process-wide stage latencies and event counters.
+
+        Recording a sample is a lock, a clock read and a deque append, so the
+        hooks are cheap enough to leave on in the camera loop.
+
+        Parameters:
+        - enabled: When False, the hooks record nothing.
+        - window: Number of recent samples kept per stage for the percentiles.
+        """
+        self.enabled = enabled
+        self.window = window
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """Record the duration of one run of a stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    def increment(self, event: str, value: int = 1):
+        """Add to an event counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + value
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Time the body of a `with` block as one run of a stage."""
+        if not self.enabled:
+            yield
+            return
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time)
+
+    def snapshot(self):
+        """Current stage summaries and counters as a JSON-serializable dict."""
+        with self._lock:
+            histograms = {
+                stage: histogram.summary()
+                for stage, histogram in self.histograms.items()
+            }
+            counters = dict(self.counters)
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": time.time() - self.started,
+            "stages": histograms,
+            "counters": counters,
+        }
+
+    def to_prometheus(self) -> str:
+        """Render the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP face_pipeline_stage_seconds Latency of each pipeline stage.",
+            "# TYPE face_pipeline_stage_seconds summary",
+        ]
+        for stage, summary in sorted(snapshot["stages"].items()):
+            for q in QUANTILES:
+                value = summary[f"p{round(q * 100)}"]
+                if value is not None:
+                    lines.append(
+                        f'face_pipeline_stage_seconds{{stage="{stage}",quantile="{q}"}} {value}'
+                    )
+            lines.append(
+                f'face_pipeline_stage_seconds_sum{{stage="{stage}"}} {summary["sum"]}'
+            )
+            lines.append(
+                f'face_pipeline_stage_seconds_count{{stage="{stage}"}} {summary["count"]}'
+            )
+
+        lines += [
+            "# HELP face_pipeline_events_total Pipeline event counters.",
+            "# TYPE face_pipeline_events_total counter",
+        ]
+        for event, value in sorted(snapshot["counters"].items()):
+            lines.append(f'face_pipeline_events_total{{event="{event}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path: str):
+        """Write the snapshot to a JSON file, replacing it atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        """Forget every sample and counter."""
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def start_http_server(self, port: int, host: str = "0.0.0.0"):
+        """
+        Serve `/metrics` (Prometheus text) and `/metrics.json` from a daemon
+        thread.
+
+        Returns:
+        - server: The running HTTP server, call `shutdown()` to stop it.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes would flood the console
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        print(f"INFO: Metrics served on http://{host}:{port}/metrics")
+        return server
+
+    def start_periodic_dump(self, path: str, interval: float):
+        """
+        Dump the snapshot to a JSON file every `interval` seconds from a daemon
+        thread.
+
+        Returns:
+        - stop_event: Set it to stop dumping.
+        """
+        stop_event = threading.Event()
+
+        def dump_loop():
+            while not stop_event.wait(interval):
+                try:
+                    self.dump_json(path)
+                except OSError as e:
+                    print(f"ERROR: Failed to dump metrics: {e}")
+
+        threading.Thread(target=dump_loop, daemon=True).start()
+        print(f"INFO: Metrics dumped to {path} every {interval}s")
+        return stop_event
+
+
+# Shared by every stage of the pipeline
+metrics = MetricsRegistry()
+
+
+def start_metrics_export():
+    """Start the exporters configured in core.config, if any."""
+    if not metrics.enabled:
+        return
+    if METRICS_HTTP_PORT:
+        metrics.start_http_server(METRICS_HTTP_PORT)
+    if METRICS_DUMP_PATH:
+        metrics.start_periodic_dump(METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL_SECONDS)
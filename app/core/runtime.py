@@ -0,0 +1,181 @@
+import os
+import sys
+
+from .config import (
+    CPU_THREAD_BUDGET,
+    TF_INTRA_OP_THREADS,
+    TF_INTER_OP_THREADS,
+    TORCH_INTRA_OP_THREADS,
+    TORCH_INTER_OP_THREADS,
+    OPENCV_THREADS,
+    CPU_AFFINITY,
+    FACE_DETECTOR_BACKEND,
+)
+
+
+def usable_cores() -> int:
+    """Number of cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def uses_tensorflow() -> bool:
+    """
+    Whether this process runs TensorFlow: the "mtcnn" detector backend or
+    code that imported it already. Importing it just to size its thread
+    pools would load it with the torch backend too.
+    """
+    return FACE_DETECTOR_BACKEND == "mtcnn" or "tensorflow" in sys.modules
+
+
+def thread_settings(budget=None):
+    """
+    Thread counts derived from core.config.
+
+    Parameters:
+    - budget: Total threads to share out, defaults to CPU_THREAD_BUDGET or
+      every usable core.
+
+    Returns:
+    - settings: Dict of thread counts per library.
+    """
+    budget = budget or CPU_THREAD_BUDGET or usable_cores()
+    half = max(1, budget // 2)
+    return {
+        "budget": budget,
+        "tf_intra_op": TF_INTRA_OP_THREADS or half,
+        "tf_inter_op": TF_INTER_OP_THREADS or half,
+        "torch_intra_op": TORCH_INTRA_OP_THREADS or half,
+        "torch_inter_op": TORCH_INTER_OP_THREADS or half,
+        "opencv": OPENCV_THREADS if OPENCV_THREADS is not None else half,
+    }
+
+
+def configure_threads(budget=None):
+    """
+    Apply the thread budget to TensorFlow, PyTorch and OpenCV.
+
+    Call it before the models are created: TensorFlow and the PyTorch
+    inter-op pool can only be sized before their first use, later attempts
+    are reported and skipped.
+
+    Parameters:
+    - budget: Total threads to share out, see `thread_settings`.
+
+    Returns:
+    - errors: Settings that could not be applied, by name.
+    """
+    settings = thread_settings(budget)
+    errors = {}
+
+    import cv2
+
+    cv2.setNumThreads(settings["opencv"])
+
+    import torch
+
+    torch.set_num_threads(settings["torch_intra_op"])
+    try:
+        torch.set_num_interop_threads(settings["torch_inter_op"])
+    except RuntimeError as e:
+        errors["torch_inter_op"] = str(e)
+
+    tf = None
+    if uses_tensorflow():
+        try:
+            import tensorflow as tf
+        except ImportError:
+            pass
+    if tf is not None:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(
+                settings["tf_intra_op"]
+            )
+            tf.config.threading.set_inter_op_parallelism_threads(
+                settings["tf_inter_op"]
+            )
+        except RuntimeError as e:
+            errors["tensorflow"] = str(e)
+
+    return errors
+
+
+def set_affinity(cores):
+    """Restrict the calling thread to the given cores (Linux only)."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+
+def pin_thread(*stages):
+    """
+    Pin the calling thread to the cores configured for the stages it runs,
+    their union when it runs several, e.g. detection and encoding.
+
+    Call it once when the thread starts, before it runs TensorFlow or
+    PyTorch: their pool threads are created on first use and keep the
+    affinity of the thread that created them, later changes do not reach them.
+    """
+    cores = set()
+    for stage in stages:
+        stage_cores = CPU_AFFINITY.get(stage)
+        if not stage_cores:
+            # The stage may run on every core
+            return
+        cores.update(stage_cores)
+    set_affinity(cores)
+
+
+def runtime_report():
+    """Effective thread counts and CPU affinity of this process."""
+    import cv2
+    import torch
+
+    report = {
+        "cpu_count": os.cpu_count(),
+        "usable_cores": usable_cores(),
+        "configured": thread_settings(),
+        "torch_intra_op": torch.get_num_threads(),
+        "torch_inter_op": torch.get_num_interop_threads(),
+        "opencv": cv2.getNumThreads(),
+        "stage_affinity": dict(CPU_AFFINITY),
+    }
+    if uses_tensorflow():
+        try:
+            import tensorflow as tf
+
+            # 0 means TensorFlow picks the number of threads itself
+            report["tf_intra_op"] = (
+                tf.config.threading.get_intra_op_parallelism_threads()
+            )
+            report["tf_inter_op"] = (
+                tf.config.threading.get_inter_op_parallelism_threads()
+            )
+        except ImportError:
+            pass
+    return report
+
+
+def apply_runtime_config():
+    """Configure the thread budget and print the effective settings."""
+    errors = configure_threads()
+    report = runtime_report()
+
+    print("INFO: Runtime configuration")
+    print(f"  CPU cores: {report['usable_cores']} usable of {report['cpu_count']}")
+    print(
+        f"  PyTorch threads: intra-op {report['torch_intra_op']}, "
+        f"inter-op {report['torch_inter_op']}"
+    )
+    if "tf_intra_op" in report:
+        print(
+            f"  TensorFlow threads: intra-op {report['tf_intra_op']}, "
+            f"inter-op {report['tf_inter_op']}"
+        )
+    print(f"  OpenCV threads: {report['opencv']}")
+    for stage, cores in report["stage_affinity"].items():
+        print(f"  {stage} cores: {'all' if not cores else cores}")
+    for name, error in errors.items():
+        print(f"WARNING: Could not apply {name} threads: {error}")
+
+    return report
@@ -0,0 +1,77 @@
+import sys
+import types
+
+import numpy as np
+
+
+def shard_worker(connection, threads):
+    """
+    Worker process holding one shard of a ShardedFaceGallery.
+
+    Lives in `core` so a spawned worker only imports NumPy, not the models
+    package with its TensorFlow and torch dependencies.
+
+    Commands are (name, payload) tuples: ("add", (indices, rows)) appends rows
+    with their global gallery indices, ("search", (probes, k, excluded))
+    returns the local top-k global indices and scores of each probe, skipping
+    the global indices in `excluded` (or None), ("close", None) stops.
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+
+        # The shards share the cores, one BLAS pool per shard would oversubscribe
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+    indices = np.empty(0, dtype=np.int64)
+    embeddings = None
+    while True:
+        command, payload = connection.recv()
+        if command == "close":
+            break
+
+        try:
+            if command == "add":
+                new_indices, rows = payload
+                indices = np.concatenate([indices, new_indices])
+                embeddings = (
+                    rows if embeddings is None else np.concatenate([embeddings, rows])
+                )
+                connection.send(len(indices))
+            elif command == "search":
+                probes, k, excluded = payload
+                k = min(k, len(indices))
+                if k == 0:
+                    empty = np.empty((len(probes), 0))
+                    connection.send((empty.astype(np.int64), empty.astype(np.float32)))
+                    continue
+                scores = probes @ embeddings.T
+                if excluded is not None:
+                    scores[:, np.isin(indices, excluded)] = -np.inf
+                if k < len(indices):
+                    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+                else:
+                    top = np.broadcast_to(np.arange(k), scores.shape)
+                connection.send((indices[top], np.take_along_axis(scores, top, axis=1)))
+            else:
+                raise Exception(f"Unknown shard command '{command}'")
+        except Exception as e:
+            connection.send(e)
+
+
+def start_worker(process):
+    """
+    Start a spawned process without importing the parent's main script.
+
+    A spawned child runs the main script's imports again (main.py and
+    main-cli.py load the models and the Qt controllers), which would cost
+    every worker seconds and memory for code it never uses. The target must
+    live in a module that does not need them, like `shard_worker`.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        process.start()
+    finally:
+        sys.modules["__main__"] = main
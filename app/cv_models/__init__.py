@@ -1,4 +1,15 @@
 from .mtcnn import MTCNNFaceDetector
+from .torch_mtcnn import TorchMTCNNFaceDetector
 from .encoder_class import FaceEncoder
+from .motion import MotionDetector
+from .roi import ROIFaceDetector
+from .factory import create_face_detector
 
-__all__ = ["MTCNNFaceDetector", "FaceEncoder"]
+__all__ = [
+    "MTCNNFaceDetector",
+    "TorchMTCNNFaceDetector",
+    "FaceEncoder",
+    "MotionDetector",
+    "ROIFaceDetector",
+    "create_face_detector",
+]
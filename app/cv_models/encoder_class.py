@@ -5,8 +5,14 @@ from PIL import Image
 import matplotlib.pyplot as plt
 import torch
 
+from core import metrics
+
 
 class FaceEncoder:
+    FACE_SIZE = 160
+    # Identifies the embedding space, embeddings of other models do not compare
+    MODEL_VERSION = "inception_resnet_v1/vggface2"
+
     def __init__(self, min_face_size=30, threshold=0.4, device="cpu"):
         """
         Initializes the FaceEncoder class with InceptionResNetV1 model and other configurations.
@@ -23,17 +29,13 @@ class FaceEncoder:
         # Initialize the Inception ResNet V1 model for face encoding
         self.model = InceptionResnetV1(pretrained="vggface2").eval().to(device)
 
-    def align_face(self, image, landmarks):
-        """
-        Aligns a face and visualizes the process using OpenCV
+        # Reusable input batch and warp scratch, grown on demand
+        self._batch = np.empty((0, 3, self.FACE_SIZE, self.FACE_SIZE), np.float32)
+        self._aligned = np.empty((self.FACE_SIZE, self.FACE_SIZE, 3), np.uint8)
 
-        Args:
-            image: Input image (BGR format as numpy array)
-            landmarks: Dictionary containing 'left_eye', 'right_eye', and 'nose' points
-
-        Returns:
-            aligned_face: Aligned face image
-        """
+    @staticmethod
+    def alignment_matrix(landmarks):
+        """Similarity transform mapping the eyes and nose to their template."""
         eyes = [landmarks["left_eye"], landmarks["right_eye"]]
         nose = landmarks["nose"]
         standard_eye_position = [(50, 50), (110, 50)]
@@ -45,7 +47,21 @@ class FaceEncoder:
         )
 
         matrix, _ = cv2.estimateAffinePartial2D(src_pts, dst_pts)
-        aligned_face = cv2.warpAffine(image, matrix, (160, 160))
+        return matrix
+
+    def align_face(self, image, landmarks):
+        """
+        Aligns a face and visualizes the process using OpenCV
+
+        Args:
+            image: Input image (BGR format as numpy array)
+            landmarks: Dictionary containing 'left_eye', 'right_eye', and 'nose' points
+
+        Returns:
+            aligned_face: Aligned face image
+        """
+        matrix = self.alignment_matrix(landmarks)
+        aligned_face = cv2.warpAffine(image, matrix, (self.FACE_SIZE, self.FACE_SIZE))
 
         return aligned_face
 
@@ -63,6 +79,55 @@ class FaceEncoder:
         encoding = self.model(aligned_face_tensor)
         return encoding
 
+    def batch_buffer(self, size: int) -> np.ndarray:
+        """
+        First `size` slots of the reusable float32 [N, 3, 160, 160] batch.
+
+        The buffer is shared by every call, so its content is only valid until
+        the next batch is prepared.
+        """
+        if self._batch.shape[0] < size:
+            capacity = max(size, 2 * self._batch.shape[0])
+            self._batch = np.empty(
+                (capacity, 3, self.FACE_SIZE, self.FACE_SIZE), dtype=np.float32
+            )
+        return self._batch[:size]
+
+    @staticmethod
+    def normalize_batch(batch: np.ndarray):
+        """Scale [0, 255] pixels to [-1, 1] in place, (x / 255 - 0.5) / 0.5."""
+        batch *= 2.0 / 255.0
+        batch -= 1.0
+
+    def forward_batch(self, batch: np.ndarray):
+        """Run the model on a prepared batch, one [1, 512] tensor per face."""
+        with torch.no_grad():
+            encodings = self.model(torch.from_numpy(batch).to(self.device))
+        # Clone the rows so each embedding pickles without the whole batch
+        return [encoding.clone() for encoding in encodings.split(1)]
+
+    def encode_batch(self, aligned_faces):
+        """
+        Encode several aligned faces with a single forward pass.
+
+        Parameters:
+        - aligned_faces: List of aligned face images (NumPy arrays).
+
+        Returns:
+        - encodings: List of face encodings, one [1, 512] tensor per face.
+        """
+        if len(aligned_faces) == 0:
+            return []
+
+        batch = self.batch_buffer(len(aligned_faces))
+        for slot, face in zip(batch, aligned_faces):
+            if face.shape[:2] != (self.FACE_SIZE, self.FACE_SIZE):
+                face = cv2.resize(face, (self.FACE_SIZE, self.FACE_SIZE))
+            # HWC uint8 -> CHW float32, converted while copying into the slot
+            slot[...] = face.transpose(2, 0, 1)
+        self.normalize_batch(batch)
+        return self.forward_batch(batch)
+
     def transform_to_tensor(self, image):
         """
         Convert the image to a tensor.
@@ -73,27 +138,17 @@ class FaceEncoder:
         Returns:
         - Tensor: The image converted to a tensor.
         """
-        image_np = np.array(image)
-
-        # Resize the image using OpenCV
-        image_resized = cv2.resize(image_np, (160, 160))
-
-        # Normalize the image (using ImageNet mean and std values for FaceNet)
-        mean = [0.5, 0.5, 0.5]
-        std = [0.5, 0.5, 0.5]
+        image_np = np.asarray(image)
 
-        # Scale pixel values to [0, 1]
-        image_resized = image_resized.astype(np.float32) / 255.0
-        image_resized = (image_resized - mean) / std
+        # Aligned faces are already 160x160
+        if image_np.shape[:2] != (self.FACE_SIZE, self.FACE_SIZE):
+            image_np = cv2.resize(image_np, (self.FACE_SIZE, self.FACE_SIZE))
 
-        # Convert the image to a tensor
-        image_tensor = torch.tensor(
-            image_resized.transpose(2, 0, 1),
-            dtype=torch.float32,
-        )  # Convert to [C, H, W]
-        image_tensor = image_tensor.unsqueeze(0)  # Add batch dimension
+        # Convert to [1, C, H, W] float32 and normalize to [-1, 1] (mean and std 0.5)
+        batch = image_np.transpose(2, 0, 1)[None].astype(np.float32)
+        self.normalize_batch(batch)
 
-        return image_tensor
+        return torch.from_numpy(batch)
 
     def process_face(self, image, face):
         """
@@ -107,16 +162,20 @@ class FaceEncoder:
         - encoded_face: The encoded face (512D feature vector).
         """
         # Align the face based on landmarks
-        aligned_face = self.align_face(image, face["keypoints"])
+        with metrics.timed("align"):
+            aligned_face = self.align_face(image, face["keypoints"])
 
         # Encode the aligned face
-        encoded_face = self.encode_face(aligned_face)
+        with metrics.timed("encode"):
+            encoded_face = self.encode_face(aligned_face)
+        metrics.increment("faces_encoded")
 
         return encoded_face
 
     def process_faces(self, image, faces):
         """
-        Process multiple detected faces: align and encode each one.
+        Process multiple detected faces: align them into one batch and encode
+        it with a single forward pass.
 
         Parameters:
         - image: Input image (NumPy array).
@@ -125,10 +184,46 @@ class FaceEncoder:
         Returns:
         - encoded_faces: List of encoded faces (feature vectors).
         """
-        encoded_faces = []
+        return self.process_frames([image], [faces])[0]
 
-        for face in faces:
-            encoded_face = self.process_face(image, face)
-            encoded_faces.append(encoded_face)
+    def process_frames(self, images, faces_per_image):
+        """
+        Align the faces of several images into one batch and encode it with a
+        single forward pass.
+
+        Parameters:
+        - images: Input images (NumPy arrays).
+        - faces_per_image: One list of detected faces per image.
 
+        Returns:
+        - encoded_faces: One list of encoded faces per image, in the same order.
+        """
+        total = sum(len(faces) for faces in faces_per_image)
+        if total == 0:
+            return [[] for _ in images]
+
+        # Each face is warped straight into its slot of the batch buffer
+        with metrics.timed("align"):
+            batch = self.batch_buffer(total)
+            slots = iter(batch)
+            for image, faces in zip(images, faces_per_image):
+                for face in faces:
+                    matrix = self.alignment_matrix(face["keypoints"])
+                    cv2.warpAffine(
+                        image,
+                        matrix,
+                        (self.FACE_SIZE, self.FACE_SIZE),
+                        dst=self._aligned,
+                    )
+                    next(slots)[...] = self._aligned.transpose(2, 0, 1)
+            self.normalize_batch(batch)
+
+        with metrics.timed("encode"):
+            encodings = self.forward_batch(batch)
+        metrics.increment("faces_encoded", total)
+
+        encoded_faces, offset = [], 0
+        for faces in faces_per_image:
+            encoded_faces.append(encodings[offset : offset + len(faces)])
+            offset += len(faces)
         return encoded_faces
@@ -0,0 +1,28 @@
+from core import FACE_DETECTOR_BACKEND
+
+FACE_DETECTOR_BACKENDS = ("mtcnn", "torch")
+
+
+def create_face_detector(backend=FACE_DETECTOR_BACKEND):
+    """
+    Create the face detector of a backend.
+
+    Parameters:
+    - backend: "mtcnn" for the TensorFlow MTCNN, "torch" for the PyTorch one.
+
+    Returns:
+    - detector: Object with `detect_faces(image)` returning the face dicts
+      (box, confidence, keypoints).
+    """
+    if backend == "mtcnn":
+        from .mtcnn import MTCNNFaceDetector
+
+        return MTCNNFaceDetector()
+    if backend == "torch":
+        from .torch_mtcnn import TorchMTCNNFaceDetector
+
+        return TorchMTCNNFaceDetector()
+    raise Exception(
+        f"Unknown face detector backend '{backend}', "
+        f"expected one of {', '.join(FACE_DETECTOR_BACKENDS)}"
+    )
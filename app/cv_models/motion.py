@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+from core import (
+    MOTION_DOWNSCALE_WIDTH,
+    MOTION_PIXEL_THRESHOLD,
+    MOTION_MIN_AREA_RATIO,
+    MOTION_LEARNING_RATE,
+)
+
+
+class MotionDetector:
+    def __init__(
+        self,
+        width=MOTION_DOWNSCALE_WIDTH,
+        pixel_threshold=MOTION_PIXEL_THRESHOLD,
+        min_area_ratio=MOTION_MIN_AREA_RATIO,
+        learning_rate=MOTION_LEARNING_RATE,
+    ):
+        """
+        Detects motion by differencing downscaled frames against a running
+        average background.
+
+        Parameters:
+        - width: Width the frames are downscaled to before differencing.
+        - pixel_threshold: Grey level change counted as a changed pixel.
+        - min_area_ratio: Fraction of changed pixels reported as motion.
+        - learning_rate: Speed at which the background adapts to the scene.
+        """
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_area_ratio = min_area_ratio
+        self.learning_rate = learning_rate
+        self.background = None
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        """Downscale, convert to grey and blur a BGR frame."""
+        h, w = frame.shape[:2]
+        height = max(1, round(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def detect(self, frame: np.ndarray) -> bool:
+        """
+        Compare a frame with the background model and update the model.
+
+        Returns:
+        - motion: True if enough of the frame changed.
+        """
+        gray = self._prepare(frame)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        changed = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+        return changed >= self.min_area_ratio
+
+    def reset(self):
+        """Forget the background model."""
+        self.background = None
@@ -1,4 +1,5 @@
-from mtcnn import MTCNN
+from collections import defaultdict
+
 import numpy as np
 import cv2
 
@@ -12,6 +13,9 @@ class MTCNNFaceDetector:
     }
 
     def __init__(self):
+        # Imported here so TensorFlow is only required by this backend
+        from mtcnn import MTCNN
+
         self.detector = MTCNN()
 
     def detect_faces(self, data: np.ndarray):
@@ -33,3 +37,42 @@ class MTCNNFaceDetector:
         else:
             print("Unsupported data type. Expected NumPy array.")
             return []
+
+    def detect_faces_batch(self, frames):
+        """
+        Detect faces in several BGR frames.
+
+        Frames of the same shape are detected in one call, so no frame is
+        padded to the size of a larger one.
+
+        Parameters:
+        - frames: List of BGR images (NumPy arrays).
+
+        Returns:
+        - faces: One list of face dicts per frame, in the same order.
+        """
+        results = [[] for _ in frames]
+        groups = defaultdict(list)
+        for i, frame in enumerate(frames):
+            if (
+                isinstance(frame, np.ndarray)
+                and frame.ndim == 3
+                and frame.shape[-1] == 3
+            ):
+                groups[frame.shape].append(i)
+            else:
+                print("Invalid image shape.")
+
+        for indices in groups.values():
+            batch = [cv2.cvtColor(frames[i], cv2.COLOR_BGR2RGB) for i in indices]
+            detections = self.detector.detect_faces(
+                batch,
+                threshold_pnet=self.CONFIG["threshold_pnet"],
+                threshold_rnet=self.CONFIG["threshold_rnet"],
+                threshold_onet=self.CONFIG["threshold_onet"],
+                min_face_size=self.CONFIG["min_face_size"],
+            )
+            for i, faces in zip(indices, detections):
+                results[i] = faces
+
+        return results
@@ -0,0 +1,114 @@
+import numpy as np
+
+from core import ROI_EXPAND, ROI_FULL_SCAN_INTERVAL, metrics
+
+
+class ROIFaceDetector:
+    def __init__(
+        self, detector, expand=ROI_EXPAND, full_scan_interval=ROI_FULL_SCAN_INTERVAL
+    ):
+        """
+        Wraps a face detector for a video stream: faces are first searched in
+        expanded crops around the boxes of the previous frame, which is much
+        cheaper than a full image pyramid.
+
+        The whole frame is scanned when there is no previous face, when a crop
+        misses its face, and every `full_scan_interval` frames so new faces
+        entering the frame are found.
+
+        Parameters:
+        - detector: Face detector with `detect_faces(image)`.
+        - expand: Margin added on each side of a box, relative to its size.
+        - full_scan_interval: Maximum number of frames between full scans.
+        """
+        self.detector = detector
+        self.expand = expand
+        self.full_scan_interval = full_scan_interval
+
+        self.boxes = []
+        self.frame_shape = None
+        self.frames_since_scan = 0
+        self.stats = {"roi_hits": 0, "roi_misses": 0, "full_scans": 0}
+
+    def reset(self):
+        """Forget the previous faces, the next frame gets a full scan."""
+        self.boxes = []
+        self.frame_shape = None
+        self.frames_since_scan = 0
+
+    def roi(self, box, shape):
+        """Expanded region [x0, y0, x1, y1] around a box, clipped to the frame."""
+        x, y, w, h = box
+        margin = int(self.expand * max(w, h))
+        height, width = shape[:2]
+        return (
+            max(0, x - margin),
+            max(0, y - margin),
+            min(width, x + w + margin),
+            min(height, y + h + margin),
+        )
+
+    @staticmethod
+    def offset_face(face, dx, dy):
+        """Move a face found in a crop back to frame coordinates."""
+        x, y, w, h = face["box"]
+        moved = dict(face)
+        moved["box"] = [x + dx, y + dy, w, h]
+        moved["keypoints"] = {
+            name: (px + dx, py + dy) for name, (px, py) in face["keypoints"].items()
+        }
+        return moved
+
+    @staticmethod
+    def contains_center(box, face):
+        """True if the center of a face lies inside a box."""
+        x, y, w, h = box
+        fx, fy, fw, fh = face["box"]
+        cx, cy = fx + fw / 2, fy + fh / 2
+        return x <= cx <= x + w and y <= cy <= y + h
+
+    def full_scan(self, data):
+        self.stats["full_scans"] += 1
+        metrics.increment("roi_full_scans")
+        self.frames_since_scan = 0
+        return self.detector.detect_faces(data)
+
+    def detect_faces(self, data: np.ndarray):
+        if not isinstance(data, np.ndarray):
+            return self.detector.detect_faces(data)
+
+        if data.shape != self.frame_shape:
+            self.reset()
+            self.frame_shape = data.shape
+
+        self.frames_since_scan += 1
+        if not self.boxes or self.frames_since_scan >= self.full_scan_interval:
+            faces = self.full_scan(data)
+        else:
+            faces = []
+            for box in self.boxes:
+                x0, y0, x1, y1 = self.roi(box, data.shape)
+                found = [
+                    self.offset_face(face, x0, y0)
+                    for face in self.detector.detect_faces(data[y0:y1, x0:x1])
+                ]
+                if not found:
+                    # The face moved too far or left, rescan the whole frame
+                    self.stats["roi_misses"] += 1
+                    metrics.increment("roi_misses")
+                    faces = self.full_scan(data)
+                    break
+
+                self.stats["roi_hits"] += 1
+                metrics.increment("roi_hits")
+                # Crops of nearby faces overlap, keep each face once
+                for face in found:
+                    if not any(self.contains_center(f["box"], face) for f in faces):
+                        faces.append(face)
+
+        self.boxes = [face["box"] for face in faces]
+        return faces
+
+    def detect_faces_batch(self, frames):
+        """Frames of a batch need not come from one stream, scan them fully."""
+        return self.detector.detect_faces_batch(frames)
@@ -0,0 +1,113 @@
+from collections import defaultdict
+
+import cv2
+import numpy as np
+import torch
+from facenet_pytorch import MTCNN
+
+KEYPOINT_NAMES = ("left_eye", "right_eye", "nose", "mouth_left", "mouth_right")
+
+
+class TorchMTCNNFaceDetector:
+    # Same settings as MTCNNFaceDetector, so both backends find the same faces
+    CONFIG = {
+        "threshold_pnet": 0.6,
+        "threshold_rnet": 0.7,
+        "threshold_onet": 0.9,
+        "min_face_size": 30,
+    }
+
+    def __init__(self, device="cpu"):
+        """
+        MTCNN face detector running on PyTorch, without TensorFlow.
+
+        It shares the PyTorch thread pool with the encoder and returns the same
+        face dicts as MTCNNFaceDetector.
+
+        Parameters:
+        - device: Device to use for inference ('cpu' or 'cuda').
+        """
+        self.detector = MTCNN(
+            keep_all=True,
+            min_face_size=self.CONFIG["min_face_size"],
+            thresholds=[
+                self.CONFIG["threshold_pnet"],
+                self.CONFIG["threshold_rnet"],
+                self.CONFIG["threshold_onet"],
+            ],
+            device=device,
+        )
+
+    @staticmethod
+    def to_faces(boxes, probs, points):
+        """Convert the MTCNN outputs of one image to face dicts."""
+        if boxes is None:
+            return []
+
+        faces = []
+        for box, prob, landmarks in zip(boxes, probs, points):
+            x1, y1, x2, y2 = (int(round(float(v))) for v in box)
+            faces.append(
+                {
+                    "box": [max(0, x1), max(0, y1), x2 - x1, y2 - y1],
+                    "confidence": float(prob),
+                    "keypoints": {
+                        name: (int(round(float(x))), int(round(float(y))))
+                        for name, (x, y) in zip(KEYPOINT_NAMES, landmarks)
+                    },
+                }
+            )
+        return faces
+
+    def detect_faces(self, data: np.ndarray):
+        if isinstance(data, np.ndarray):
+            # Convert to RGB if image is in BGR (OpenCV)
+            if data.ndim == 3 and data.shape[-1] == 3:
+                image_rgb = cv2.cvtColor(data, cv2.COLOR_BGR2RGB)
+            else:
+                print("Invalid image shape.")
+                return []
+
+            with torch.no_grad():
+                boxes, probs, points = self.detector.detect(image_rgb, landmarks=True)
+            return self.to_faces(boxes, probs, points)
+        else:
+            print("Unsupported data type. Expected NumPy array.")
+            return []
+
+    def detect_faces_batch(self, frames):
+        """
+        Detect faces in several BGR frames.
+
+        Frames of the same shape are stacked and detected in one call.
+
+        Parameters:
+        - frames: List of BGR images (NumPy arrays).
+
+        Returns:
+        - faces: One list of face dicts per frame, in the same order.
+        """
+        results = [[] for _ in frames]
+        groups = defaultdict(list)
+        for i, frame in enumerate(frames):
+            if (
+                isinstance(frame, np.ndarray)
+                and frame.ndim == 3
+                and frame.shape[-1] == 3
+            ):
+                groups[frame.shape].append(i)
+            else:
+                print("Invalid image shape.")
+
+        for indices in groups.values():
+            batch = np.stack(
+                [cv2.cvtColor(frames[i], cv2.COLOR_BGR2RGB) for i in indices]
+            )
+            with torch.no_grad():
+                boxes, probs, points = self.detector.detect(batch, landmarks=True)
+            for i, frame_boxes, frame_probs, frame_points in zip(
+                indices, boxes, probs, points
+            ):
+                results[i] = self.to_faces(frame_boxes, frame_probs, frame_points)
+
+        return results
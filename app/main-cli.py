@@ -1,6 +1,24 @@
-from core import AppContext, DETECTION_THRESHOLD
-from models import UserRepository
-from test import FaceRecognitionTester
+from datetime import date
+
+from core import (
+    AppContext,
+    DETECTION_THRESHOLD,
+    CALIBRATION_TARGET_FAR,
+    start_metrics_export,
+    apply_runtime_config,
+)
+from models import (
+    UserRepository,
+    AttendanceRepository,
+    AttendanceExporter,
+    GalleryArchive,
+)
+from test import (
+    FaceRecognitionTester,
+    PipelineBenchmark,
+    GalleryCompressionBenchmark,
+    ThresholdCalibrator,
+)
 from controllers import FaceRegistrationController, FaceRecognitionController
 
 
@@ -119,8 +137,136 @@ def sign_in(ctx: AppContext):
         print(f"SUCCESS: User {user} attendance marked.")
 
 
+def prompt_date(label: str):
+    """Ask for an optional YYYY-MM-DD date, returns None when left empty."""
+    while True:
+        value = input(f"{label} (YYYY-MM-DD, empty for none): ").strip()
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            print("ERROR: Invalid date. Try again.")
+
+
+def export_attendance(ctx: AppContext):
+    print("\n--- Export Attendance History ---")
+    fmt = input("Enter format [csv/parquet]: ").strip().lower() or "csv"
+    output_path = input(f"Enter output path [attendance.{fmt}]: ").strip()
+    output_path = output_path or f"attendance.{fmt}"
+    start_date = prompt_date("Start date")
+    end_date = prompt_date("End date")
+    user_name = input("Username (empty for all users): ").strip() or None
+
+    exporter = AttendanceExporter(AttendanceRepository(ctx))
+    try:
+        count = exporter.export(
+            output_path,
+            fmt=fmt,
+            start_date=start_date,
+            end_date=end_date,
+            user_name=user_name,
+        )
+    except Exception as e:
+        print("ERROR:", e)
+        return
+
+    print(f"SUCCESS: Exported {count} attendance records to {output_path}")
+
+
+def export_gallery(ctx: AppContext):
+    print("\n--- Export Gallery ---")
+    output_path = input("Enter output path [gallery.npz]: ").strip() or "gallery.npz"
+
+    try:
+        count = GalleryArchive(UserRepository(ctx)).export(output_path)
+    except Exception as e:
+        print("ERROR:", e)
+        return
+
+    print(f"SUCCESS: Exported {count} users to {output_path}")
+
+
+def import_gallery(ctx: AppContext):
+    print("\n--- Import Gallery ---")
+    input_path = input("Enter archive path [gallery.npz]: ").strip() or "gallery.npz"
+
+    try:
+        inserted, skipped = GalleryArchive(UserRepository(ctx)).restore(input_path)
+    except Exception as e:
+        print("ERROR:", e)
+        return
+
+    print(f"SUCCESS: Imported {inserted} users ({skipped} already registered)")
+
+
+def run_tests():
+    print("\n--- Run Tests ---")
+    print("1. Full test (register through the database, show confusion matrix)")
+    print("2. Fast evaluation (batched, JSON report, no plot)")
+    choice = input("Enter choice [1-2]: ").strip()
+
+    if choice == "1":
+        test_ctx = AppContext(TEST_DB_PATH)
+        migrate(test_ctx)
+        tester = FaceRecognitionTester(test_ctx)
+        tester.run_tests()
+
+        cleanup(test_ctx)
+
+        # Delete the test database
+        run_migration_down(test_ctx.db.engine)
+    elif choice == "2":
+        FaceRecognitionTester(None, show_plot=False).run_fast_evaluation()
+    else:
+        print("ERROR: Invalid choice.")
+
+
+def run_benchmarks():
+    print("\n--- Benchmarks ---")
+    print("1. Full pipeline (detection, encoding, matching, attendance)")
+    print("2. Gallery matching only")
+    print("3. Attendance writes only")
+    print("4. Gallery compression accuracy")
+    print("5. Sharded gallery throughput")
+    choice = input("Enter choice [1-5]: ").strip()
+
+    if choice == "1":
+        PipelineBenchmark().run()
+    elif choice == "2":
+        PipelineBenchmark().run(stages=("gallery",))
+    elif choice == "3":
+        PipelineBenchmark().run(stages=("attendance",))
+    elif choice == "4":
+        GalleryCompressionBenchmark().run()
+    elif choice == "5":
+        PipelineBenchmark().run(stages=("sharding",))
+    else:
+        print("ERROR: Invalid choice.")
+
+
+def calibrate_threshold():
+    print("\n--- Calibrate Detection Threshold ---")
+    folder = input("Labelled image folder (empty for test_images): ").strip()
+    target_far = input(f"Target false accept rate [{CALIBRATION_TARGET_FAR}]: ").strip()
+    try:
+        target_far = float(target_far) if target_far else CALIBRATION_TARGET_FAR
+    except ValueError:
+        print("ERROR: Invalid rate.")
+        return
+
+    report = ThresholdCalibrator(folder or None, target_far=target_far).run()
+    if report["recommended"] is not None:
+        print(
+            f"INFO: Set DETECTION_THRESHOLD = "
+            f"{report['recommended']['threshold']:.3f} in app/core/config.py"
+        )
+
+
 def main():
+    apply_runtime_config()
     ctx = AppContext()
+    start_metrics_export()
     migrate(ctx)
 
     try:
@@ -130,27 +276,34 @@ def main():
             print("2. Mark Attendance")
             print("3. Run Tests")
             print("4. Compare two image for face similarity")
-            print("5. Exit")
-            choice = input("Enter choice [1-5]: ").strip()
+            print("5. Export attendance history")
+            print("6. Run benchmarks")
+            print("7. Calibrate detection threshold")
+            print("8. Export gallery")
+            print("9. Import gallery")
+            print("10. Exit")
+            choice = input("Enter choice [1-10]: ").strip()
 
             if choice == "1":
                 sign_up(ctx)
             elif choice == "2":
                 sign_in(ctx)
             elif choice == "3":
-                test_ctx = AppContext(TEST_DB_PATH)
-                migrate(test_ctx)
-                tester = FaceRecognitionTester(test_ctx)
-                tester.run_tests()
-
-                cleanup(test_ctx)
-
-                # Delete the test database
-                run_migration_down(test_ctx.db.engine)
+                run_tests()
             elif choice == "4":
                 compare_image(ctx)
                 break
             elif choice == "5":
+                export_attendance(ctx)
+            elif choice == "6":
+                run_benchmarks()
+            elif choice == "7":
+                calibrate_threshold()
+            elif choice == "8":
+                export_gallery(ctx)
+            elif choice == "9":
+                import_gallery(ctx)
+            elif choice == "10":
                 print("Exiting...")
                 break
             else:
@@ -6,7 +6,7 @@ import cv2
 
 from controllers import FaceRegistrationController
 from views import MainPage
-from core import AppContext
+from core import AppContext, start_metrics_export, apply_runtime_config
 
 from migration import run_migration_table
 
@@ -68,7 +68,9 @@ def cleanup(ctx: AppContext):
 
 def main():
     # Global application context
+    apply_runtime_config()
     ctx = AppContext()
+    start_metrics_export()
 
     app = QApplication(sys.argv)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Inspector
+from sqlalchemy import Inspector, text
 from sqlalchemy.orm import declarative_base
 
 from models.user import Users
@@ -20,6 +20,52 @@ def run_migration_table(engine):
         Attendance.__table__.create(engine, checkfirst=True)
         print("INFO: 'attendances' table created successfully.")
 
+    # Reporting indexes for databases created before they were declared
+    run_migration_indexes(engine)
+    run_migration_unique_attendance(engine)
+
+
+def run_migration_indexes(engine):
+    """Create the declared 'attendances' indexes that don't exist yet."""
+    inspector = Inspector.from_engine(engine)
+    existing_indexes = {index["name"] for index in inspector.get_indexes("attendances")}
+
+    for index in Attendance.__table__.indexes:
+        if index.name not in existing_indexes:
+            index.create(engine, checkfirst=True)
+            print(f"INFO: '{index.name}' index created successfully.")
+
+
+def run_migration_unique_attendance(engine):
+    """
+    Enforce one 'attendances' record per user and day on databases created
+    before the constraint was declared.
+
+    Duplicates are removed first, keeping the earliest record of each day.
+    SQLite cannot add a constraint to an existing table, a unique index with
+    the same name and columns is created instead.
+    """
+    name = "uq_attendances_user_id_date"
+    inspector = Inspector.from_engine(engine)
+    existing = {c["name"] for c in inspector.get_unique_constraints("attendances")}
+    existing |= {index["name"] for index in inspector.get_indexes("attendances")}
+    if name in existing:
+        return
+
+    with engine.begin() as connection:
+        duplicates = connection.execute(
+            text(
+                "DELETE FROM attendances WHERE id NOT IN "
+                "(SELECT MIN(id) FROM attendances GROUP BY user_id, date)"
+            )
+        ).rowcount
+        connection.execute(
+            text(f"CREATE UNIQUE INDEX {name} ON attendances (user_id, date)")
+        )
+    if duplicates:
+        print(f"INFO: Removed {duplicates} duplicate attendance records.")
+    print(f"INFO: '{name}' unique index created successfully.")
+
 
 def run_migration_down(engine):
     """Drop the 'users' and 'attendances' tables if they exist."""
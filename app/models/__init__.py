@@ -1,5 +1,20 @@
 from .face_detection import FaceDetection
 from .user import Users, UserRepository
 from .attendance import AttendanceRepository
+from .attendance_export import AttendanceExporter
+from .pipeline import FacePipeline
+from .async_service import AsyncFaceRecognitionService
+from .live_gallery import LiveFaceGallery
+from .gallery_archive import GalleryArchive
 
-__all__ = ["FaceDetection", "Users", "UserRepository", "AttendanceRepository"]
+__all__ = [
+    "FaceDetection",
+    "Users",
+    "UserRepository",
+    "AttendanceRepository",
+    "AttendanceExporter",
+    "FacePipeline",
+    "AsyncFaceRecognitionService",
+    "LiveFaceGallery",
+    "GalleryArchive",
+]
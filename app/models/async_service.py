@@ -0,0 +1,244 @@
+import time
+import asyncio
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+
+from core import (
+    AppContext,
+    AsyncDatabase,
+    ASYNC_INFERENCE_WORKERS,
+    ASYNC_MAX_PENDING,
+    DETECTION_THRESHOLD,
+    metrics,
+)
+from .face_detection import FaceDetection
+from .gallery import rank_candidates, unambiguous_match
+from .live_gallery import LiveFaceGallery
+from .user import Users, UserRepository
+from .attendance import Attendance, AttendanceRepository
+
+
+class AsyncFaceRecognitionService:
+    def __init__(
+        self,
+        ctx: AppContext,
+        workers=ASYNC_INFERENCE_WORKERS,
+        max_pending=ASYNC_MAX_PENDING,
+    ):
+        """
+        asyncio facade over recognition, enrollment and attendance, so many
+        requests can be served from one event loop.
+
+        Detection and encoding run in a thread pool, each thread with its own
+        models since the encoder reuses its batch buffers. At most
+        `max_pending` requests are admitted to the pool at once, later ones
+        wait on the event loop instead of queueing frames without bound. The
+        database is queried through aiosqlite.
+
+        Users are matched against a LiveFaceGallery loaded once and kept up to
+        date by UserRepository events, so no request decodes the enrolment.
+
+        Parameters:
+        - ctx: AppContext of the database, which creates the tables.
+        - workers: Number of inference threads.
+        - max_pending: Maximum number of images submitted for inference.
+        """
+        self.ctx = ctx
+        self.db = AsyncDatabase(ctx.db.db_path)
+        self.attendance_repository = AttendanceRepository(ctx)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="inference"
+        )
+        self.semaphore = asyncio.Semaphore(max_pending)
+        self._local = threading.local()
+
+        self.user_repository = UserRepository(ctx)
+        self.gallery = None
+        self._gallery_lock = threading.Lock()
+
+    def _detector(self) -> FaceDetection:
+        """FaceDetection of the calling inference thread, loaded on first use."""
+        f_detector = getattr(self._local, "f_detector", None)
+        if f_detector is None:
+            f_detector = self._local.f_detector = FaceDetection()
+        return f_detector
+
+    def _live_gallery(self) -> LiveFaceGallery:
+        """Gallery of every user, loaded in an inference thread on first use."""
+        with self._gallery_lock:
+            if self.gallery is None:
+                self.gallery = LiveFaceGallery.from_users(
+                    self.user_repository.get_all()
+                )
+                self.user_repository.subscribe(self._on_user_changed)
+            return self.gallery
+
+    def _on_user_changed(self, event: str, user: Users):
+        """Apply a repository event to the live gallery."""
+        if event == "removed":
+            self.gallery.remove(user.id)
+        else:
+            self.gallery.add_user(user)
+
+    def _rank(self, encoded_face, present_ids):
+        """Blocking ranking of a face against the users not present today."""
+        snapshot = self._live_gallery().snapshot.without(present_ids)
+        return snapshot, rank_candidates(snapshot, encoded_face[:1])[0]
+
+    def _encode(self, image):
+        """Blocking detection and encoding, run in the inference threads."""
+        f_detector = self._detector()
+        if isinstance(image, str):
+            result = f_detector.detect_faces_in_file(image)
+            if result is None:
+                raise Exception(f"Failed to read image from path: {image}")
+        else:
+            result = f_detector.detect_faces(image)
+            if result is None:
+                raise Exception("Unsupported data type. Expected a NumPy array.")
+        return result[1]
+
+    async def encode_faces(self, image):
+        """
+        Detect and encode the faces of an image without blocking the loop.
+
+        Parameters:
+        - image: BGR image (NumPy array) or image file path.
+
+        Returns:
+        - encoded_face: List of face encodings, one [1, 512] tensor per face.
+        """
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._encode, image)
+
+    async def get_user_by_name(self, user_name: str):
+        async with self.db.get_session() as session:
+            result = await session.execute(
+                select(Users).where(Users.user_name == user_name)
+            )
+            return result.scalars().first()
+
+    async def get_users_not_present_today(self):
+        """Users without an attendance record for today."""
+        async with self.db.get_session() as session:
+            result = await session.execute(
+                select(Users)
+                .outerjoin(
+                    Attendance,
+                    (Attendance.user_id == Users.id)
+                    & (Attendance.date == date.today()),
+                )
+                .where(Attendance.id.is_(None))
+            )
+            return list(result.scalars().all())
+
+    async def get_user_ids_present_today(self):
+        """Ids of the users with an attendance record for today."""
+        async with self.db.get_session() as session:
+            result = await session.execute(
+                select(Attendance.user_id).where(Attendance.date == date.today())
+            )
+            return set(result.scalars().all())
+
+    async def mark_attendance(self, user_id: int, present: bool = True):
+        """
+        Mark today's attendance of a user, unless it is already marked.
+
+        Returns:
+        - marked: True if a record was created.
+        """
+        async with self.db.get_session() as session:
+            result = await session.execute(
+                AttendanceRepository.insert_today(user_id, present)
+            )
+            await session.commit()
+            if result.rowcount == 0:
+                return False
+            user = await session.get(Users, user_id)
+
+        if user is not None:
+            self.attendance_repository.publish(user, present)
+        return True
+
+    async def authorize(self, image, threshold: float = DETECTION_THRESHOLD):
+        """
+        Recognize the first face of an image and mark the attendance of the
+        best unambiguous match among the users not yet present today.
+
+        Parameters:
+        - image: BGR image (NumPy array) or image file path.
+        - threshold: Minimum cosine similarity of a match.
+
+        Returns:
+        - user_names: Name of the user marked present, or an empty list.
+        """
+        check_in_start = time.perf_counter()
+        encoded_face, present_ids = await asyncio.gather(
+            self.encode_faces(image), self.get_user_ids_present_today()
+        )
+        if len(encoded_face) == 0:
+            metrics.observe("check_in", time.perf_counter() - check_in_start)
+            return []
+
+        # Matching runs in the inference threads, the loop stays free
+        loop = asyncio.get_running_loop()
+        snapshot, ranking = await loop.run_in_executor(
+            self.executor, self._rank, encoded_face, present_ids
+        )
+        match = unambiguous_match(ranking, threshold=threshold)
+        user_names = []
+        if match is not None:
+            index, _ = match
+            start_time = time.perf_counter()
+            if await self.mark_attendance(snapshot.user_ids[index], True):
+                metrics.increment("attendance_marked")
+                user_names.append(snapshot.user_names[index])
+            metrics.observe("db_mark_attendance", time.perf_counter() - start_time)
+
+        metrics.observe("check_in", time.perf_counter() - check_in_start)
+        return user_names
+
+    async def enroll(self, user_name: str, image):
+        """
+        Register a user with the faces of an image.
+
+        Parameters:
+        - user_name: Unique name of the user.
+        - image: BGR image (NumPy array) or image file path.
+
+        Returns:
+        - user: The created `Users` record.
+        """
+        if await self.get_user_by_name(user_name) is not None:
+            raise Exception("User already exists")
+
+        encoded_face = await self.encode_faces(image)
+        if len(encoded_face) == 0:
+            raise Exception("No face detected in the image")
+
+        user = Users(
+            user_name=user_name,
+            face_embedding=Users.encode_embedding(encoded_face),
+        )
+        start_time = time.perf_counter()
+        try:
+            async with self.db.get_session() as session:
+                session.add(user)
+                await session.commit()
+        except Exception as e:
+            raise Exception(f"Failed to add user: {e}")
+        metrics.observe("db_add_user", time.perf_counter() - start_time)
+        metrics.increment("users_registered")
+        # Keep the live galleries, this one included, up to date
+        self.user_repository.publish("added", user)
+        return user
+
+    async def close(self):
+        """Stop the inference threads and close the database connections."""
+        self.user_repository.unsubscribe(self._on_user_changed)
+        self.executor.shutdown(wait=True)
+        await self.db.close_connection()
@@ -1,10 +1,25 @@
 from datetime import date
-from sqlalchemy import Column, Integer, Boolean, Date, ForeignKey
+from sqlalchemy import (
+    Column,
+    Integer,
+    Boolean,
+    Date,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    and_,
+    func,
+    literal,
+    select,
+    union_all,
+)
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import date
 from sqlalchemy.orm import joinedload
 
 from core import AppContext
+from .listeners import ListenerRegistry
 from .user import Users
 
 Base = declarative_base()
@@ -12,6 +27,14 @@ Base = declarative_base()
 
 class Attendance(Base):
     __tablename__ = "attendances"
+    __table_args__ = (
+        # One record per user and day, concurrent check-ins insert only once
+        UniqueConstraint("user_id", "date", name="uq_attendances_user_id_date"),
+        # Per-user lookups (mark_attendance, attendance rates)
+        Index("ix_attendances_user_id_date", "user_id", "date", "present"),
+        # Date range scans (headcount series, session days, streaks)
+        Index("ix_attendances_date_present", "date", "present", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey(Users.id), nullable=False)
@@ -21,20 +44,61 @@ class Attendance(Base):
     user = relationship(Users, backref="attendances")
 
 
-class AttendanceRepository:
+class AttendanceRepository(ListenerRegistry):
     def __init__(self, ctx: AppContext):
         self.ctx = ctx
         self.db = ctx.db
 
+    def _notify(self, user_id: int, present: bool):
+        """Publish an attendance change to the registered listeners."""
+        if not self.has_listeners():
+            return
+
+        user = self.db.find(Users, id=user_id)
+        if user is None:
+            return
+        self.publish(user, present)
+
+    def publish(self, user: Users, present: bool):
+        """
+        Call the listeners registered with `subscribe` with an attendance
+        change: the `Users` record and the `present` flag.
+        """
+        self.notify_listeners("Attendance", user, present)
+
+    @staticmethod
+    def insert_today(user_id: int, present: bool):
+        """
+        INSERT of today's record of a user that does nothing if one exists.
+
+        Checking first and inserting after races with concurrent check-ins;
+        the unique (user_id, date) constraint makes this a single atomic step.
+        """
+        return (
+            insert(Attendance)
+            .values(user_id=user_id, present=present, date=date.today())
+            .on_conflict_do_nothing(index_elements=["user_id", "date"])
+        )
+
     def mark_attendance(self, user_id: int, present: bool):
-        """Marks the attendance for today for a given user."""
-        today = date.today()
+        """
+        Marks the attendance for today for a given user.
 
-        existing = self.db.find(Attendance, user_id=user_id, date=today)
+        Returns:
+        - marked: True if a record was created, False if already marked.
+        """
+        session = self.db.get_session()
+        try:
+            result = session.execute(self.insert_today(user_id, present))
+            session.commit()
+        finally:
+            session.close()
 
-        # Only create if not already marked
-        if not existing:
-            self.db.create(Attendance(user_id=user_id, present=present, date=today))
+        # Only notify if not already marked
+        if result.rowcount == 0:
+            return False
+        self._notify(user_id, present)
+        return True
 
     def get_users_not_present_today(self):
         """Get the list of users who are not present today."""
@@ -62,5 +126,253 @@ class AttendanceRepository:
             present=True,
             options=[joinedload(Attendance.user)],
         )
-        print(f"Present users count: {len(present_users)}")
         return [attendance.user for attendance in present_users]
+
+    def iter_attendance_history(
+        self,
+        start_date: date = None,
+        end_date: date = None,
+        user_name: str = None,
+        chunk_size: int = 1000,
+    ):
+        """
+        Stream attendance records joined with their user, oldest first.
+
+        Rows are fetched from the cursor `chunk_size` at a time, so memory stays
+        flat regardless of how much history is stored.
+
+        Args:
+            start_date: Only include records on or after this date.
+            end_date: Only include records on or before this date.
+            user_name: Only include records of this user.
+            chunk_size: Number of rows fetched per chunk.
+
+        Yields:
+            Lists of rows with `attendance_id`, `user_id`, `user_name`, `date`
+            and `present`.
+        """
+        query = (
+            select(
+                Attendance.id.label("attendance_id"),
+                Attendance.user_id,
+                Users.user_name,
+                Attendance.date,
+                Attendance.present,
+            )
+            .join(Users, Users.id == Attendance.user_id)
+            .order_by(Attendance.date, Attendance.user_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        if start_date is not None:
+            query = query.where(Attendance.date >= start_date)
+        if end_date is not None:
+            query = query.where(Attendance.date <= end_date)
+        if user_name is not None:
+            query = query.where(Users.user_name == user_name)
+
+        session = self.db.get_session()
+        try:
+            for chunk in session.execute(query).partitions():
+                yield chunk
+        finally:
+            session.close()
+
+    def _fetch_all(self, query):
+        """Execute a Core query and return plain rows."""
+        session = self.db.get_session()
+        try:
+            return session.execute(query).all()
+        finally:
+            session.close()
+
+    def count_session_days(self, start_date: date, end_date: date) -> int:
+        """Count the dates in the range on which any attendance was taken."""
+        query = select(func.count(func.distinct(Attendance.date))).where(
+            Attendance.date.between(start_date, end_date)
+        )
+        return self._fetch_all(query)[0][0]
+
+    def get_attendance_rates(
+        self, start_date: date, end_date: date, limit: int = 100, offset: int = 0
+    ):
+        """
+        Get the per-user attendance rate over a date range.
+
+        The rate is the number of days a user was present divided by the number
+        of session days (dates in the range on which attendance was taken).
+
+        Args:
+            start_date: First date of the range (inclusive).
+            end_date: Last date of the range (inclusive).
+            limit: Page size.
+            offset: Number of users to skip.
+
+        Returns:
+            A page of dicts ordered by user id with `user_id`, `user_name`,
+            `days_present`, `session_days` and `rate`.
+        """
+        session_days = self.count_session_days(start_date, end_date)
+
+        # Page the users first so only their attendance rows are counted
+        users = (
+            select(Users.id, Users.user_name)
+            .order_by(Users.id)
+            .limit(limit)
+            .offset(offset)
+            .subquery()
+        )
+        query = (
+            select(users.c.id, users.c.user_name, func.count(Attendance.id))
+            .select_from(users)
+            .outerjoin(
+                Attendance,
+                and_(
+                    Attendance.user_id == users.c.id,
+                    Attendance.date.between(start_date, end_date),
+                    Attendance.present.is_(True),
+                ),
+            )
+            .group_by(users.c.id, users.c.user_name)
+            .order_by(users.c.id)
+        )
+
+        return [
+            {
+                "user_id": user_id,
+                "user_name": user_name,
+                "days_present": present,
+                "session_days": session_days,
+                "rate": present / session_days if session_days else 0.0,
+            }
+            for user_id, user_name, present in self._fetch_all(query)
+        ]
+
+    def get_daily_headcount(
+        self, start_date: date, end_date: date, limit: int = 100, offset: int = 0
+    ):
+        """
+        Get the number of present users per day over a date range.
+
+        Only dates with at least one attendance record are returned.
+
+        Returns:
+            A page of dicts ordered by date with `date` and `headcount`.
+        """
+        query = (
+            select(Attendance.date, func.count(Attendance.id))
+            .where(
+                Attendance.date.between(start_date, end_date),
+                Attendance.present.is_(True),
+            )
+            .group_by(Attendance.date)
+            .order_by(Attendance.date)
+            .limit(limit)
+            .offset(offset)
+        )
+
+        return [
+            {"date": day, "headcount": headcount}
+            for day, headcount in self._fetch_all(query)
+        ]
+
+    def get_absentee_streaks(
+        self,
+        start_date: date,
+        end_date: date,
+        min_length: int = 2,
+        limit: int = 100,
+        offset: int = 0,
+    ):
+        """
+        Get runs of consecutive session days on which a user was absent.
+
+        Streaks are computed in SQL from the gaps between a user's present
+        days, numbered over the session days (dates in the range on which
+        attendance was taken), so days without any attendance such as weekends
+        do not break a streak.
+
+        Args:
+            start_date: First date of the range (inclusive).
+            end_date: Last date of the range (inclusive).
+            min_length: Minimum number of absent session days in a streak.
+            limit: Page size.
+            offset: Number of streaks to skip.
+
+        Returns:
+            A page of dicts, longest first, with `user_id`, `user_name`,
+            `start_date`, `end_date` and `length`.
+        """
+        in_range = Attendance.date.between(start_date, end_date)
+
+        distinct_days = select(Attendance.date.label("day")).where(in_range).distinct()
+        session_days = select(
+            distinct_days.c.day,
+            func.row_number().over(order_by=distinct_days.c.day).label("day_no"),
+        ).cte("session_days")
+        total_days = select(func.count()).select_from(session_days).scalar_subquery()
+
+        # Present days numbered by session day, with the previous present day
+        present_days = (
+            select(
+                Attendance.user_id,
+                session_days.c.day_no,
+                func.lag(session_days.c.day_no, 1, 0)
+                .over(partition_by=Attendance.user_id, order_by=session_days.c.day_no)
+                .label("prev_no"),
+            )
+            .join(session_days, session_days.c.day == Attendance.date)
+            .where(in_range, Attendance.present.is_(True))
+            .cte("present_days")
+        )
+
+        # Absences before and between present days
+        gaps = select(
+            present_days.c.user_id,
+            (present_days.c.prev_no + 1).label("start_no"),
+            (present_days.c.day_no - 1).label("end_no"),
+        ).where(present_days.c.day_no - present_days.c.prev_no - 1 >= min_length)
+
+        # Absences after the last present day
+        last_present = func.max(present_days.c.day_no)
+        trailing = (
+            select(
+                present_days.c.user_id,
+                (last_present + 1).label("start_no"),
+                total_days.label("end_no"),
+            )
+            .group_by(present_days.c.user_id)
+            .having(total_days - last_present >= min_length)
+        )
+
+        # Users never present in the range
+        never_present = select(
+            Users.id.label("user_id"),
+            literal(1).label("start_no"),
+            total_days.label("end_no"),
+        ).where(
+            total_days >= min_length,
+            Users.id.not_in(select(present_days.c.user_id)),
+        )
+
+        streaks = union_all(gaps, trailing, never_present).subquery("streaks")
+        start_day = session_days.alias("start_day")
+        end_day = session_days.alias("end_day")
+        length = (streaks.c.end_no - streaks.c.start_no + 1).label("length")
+
+        query = (
+            select(
+                streaks.c.user_id,
+                Users.user_name,
+                start_day.c.day.label("start_date"),
+                end_day.c.day.label("end_date"),
+                length,
+            )
+            .join(Users, Users.id == streaks.c.user_id)
+            .join(start_day, start_day.c.day_no == streaks.c.start_no)
+            .join(end_day, end_day.c.day_no == streaks.c.end_no)
+            .order_by(length.desc(), streaks.c.user_id, streaks.c.start_no)
+            .limit(limit)
+            .offset(offset)
+        )
+
+        return [row._asdict() for row in self._fetch_all(query)]
@@ -0,0 +1,96 @@
+import csv
+
+from .attendance import AttendanceRepository
+
+EXPORT_COLUMNS = ["attendance_id", "user_id", "user_name", "date", "present"]
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+class AttendanceExporter:
+    def __init__(self, repository: AttendanceRepository, chunk_size: int = 5000):
+        """
+        Streams attendance history into CSV or Parquet files.
+
+        Parameters:
+        - repository: Attendance repository to read the history from.
+        - chunk_size: Number of rows fetched and written per chunk.
+        """
+        self.repository = repository
+        self.chunk_size = chunk_size
+
+    def export(self, path, fmt="csv", start_date=None, end_date=None, user_name=None):
+        """
+        Export attendance history to a file, one chunk at a time.
+
+        Parameters:
+        - path: Output file path.
+        - fmt: Output format, 'csv' or 'parquet'.
+        - start_date: Only export records on or after this date.
+        - end_date: Only export records on or before this date.
+        - user_name: Only export records of this user.
+
+        Returns:
+        - count: Number of exported rows.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise Exception(f"Unsupported export format: {fmt}")
+
+        chunks = self.repository.iter_attendance_history(
+            start_date=start_date,
+            end_date=end_date,
+            user_name=user_name,
+            chunk_size=self.chunk_size,
+        )
+
+        if fmt == "parquet":
+            return self._write_parquet(path, chunks)
+        return self._write_csv(path, chunks)
+
+    def _write_csv(self, path, chunks):
+        """Write the row chunks to a CSV file."""
+        count = 0
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            for chunk in chunks:
+                writer.writerows(
+                    (
+                        row.attendance_id,
+                        row.user_id,
+                        row.user_name,
+                        row.date.isoformat(),
+                        int(row.present),
+                    )
+                    for row in chunk
+                )
+                count += len(chunk)
+        return count
+
+    def _write_parquet(self, path, chunks):
+        """Write each row chunk as a row group of a Parquet file."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Parquet export requires the 'pyarrow' package")
+
+        schema = pa.schema(
+            [
+                ("attendance_id", pa.int64()),
+                ("user_id", pa.int64()),
+                ("user_name", pa.string()),
+                ("date", pa.date32()),
+                ("present", pa.bool_()),
+            ]
+        )
+
+        count = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunks:
+                arrays = [
+                    pa.array(column, type=field.type)
+                    for column, field in zip(zip(*chunk), schema)
+                ]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                count += len(chunk)
+        return count
@@ -0,0 +1,352 @@
+import os
+import time
+import queue
+import itertools
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core import (
+    DETECTION_WORKERS,
+    DETECTION_POOL_SLOTS,
+    CPU_THREAD_BUDGET,
+    QUALITY_GATE_ENABLED,
+    ROI_DETECTION_ENABLED,
+    metrics,
+    pin_thread,
+)
+from core.runtime import configure_threads, usable_cores
+from .gallery import EMBEDDING_SIZE, embedding_to_array
+
+
+def _detection_worker(
+    task_queue, result_queue, quality_gate_enabled, roi_enabled, threads
+):
+    """
+    Worker process: load the models once, then detect and encode the frames
+    referenced by the tasks until a None task arrives.
+    """
+    # Before the models load, so their thread pools start on these cores
+    pin_thread("detection", "encoding")
+    configure_threads(threads)
+
+    from cv_models import FaceEncoder, ROIFaceDetector, create_face_detector
+    from .face_quality import FaceQualityGate
+
+    detector = create_face_detector()
+    if roi_enabled:
+        detector = ROIFaceDetector(detector)
+    encoder = FaceEncoder()
+    quality_gate = FaceQualityGate() if quality_gate_enabled else None
+    result_queue.put({"ready": os.getpid()})
+
+    # Slots are attached on first use and reused for every later frame, keyed
+    # by their index in the pool so a replaced slot closes the retired one
+    attached = {}
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+
+            task_id, slot_index, slot_name, shape, dtype = task
+            record = {
+                "task_id": task_id,
+                "faces": [],
+                "embeddings": np.empty((0, EMBEDDING_SIZE), dtype=np.float32),
+                "detect_seconds": 0.0,
+                "encode_seconds": 0.0,
+                "error": None,
+            }
+            frame = None
+            try:
+                slot = attached.get(slot_index)
+                if slot is not None and slot.name != slot_name:
+                    slot.close()
+                    slot = None
+                if slot is None:
+                    slot = attached[slot_index] = shared_memory.SharedMemory(
+                        name=slot_name
+                    )
+                frame = np.ndarray(shape, dtype=dtype, buffer=slot.buf)
+
+                start_time = time.perf_counter()
+                faces = detector.detect_faces(frame)
+                if quality_gate is not None:
+                    # Counted per task, the metrics of this process are not read
+                    quality_gate.reset_stats()
+                    faces = quality_gate.filter(frame, faces)
+                    record["quality_skipped"] = quality_gate.skipped
+                record["detect_seconds"] = time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                encodings = encoder.process_faces(frame, faces)
+                record["encode_seconds"] = time.perf_counter() - start_time
+
+                record["faces"] = faces
+                if encodings:
+                    record["embeddings"] = np.stack(
+                        [embedding_to_array(encoding) for encoding in encodings]
+                    )
+            except Exception as e:
+                record["error"] = str(e)
+            finally:
+                # Drop the view, a slot with a live view cannot be closed
+                del frame
+            result_queue.put(record)
+    finally:
+        for slot in attached.values():
+            slot.close()
+
+
+class DetectionPool:
+    def __init__(self, workers=DETECTION_WORKERS, slots=DETECTION_POOL_SLOTS):
+        """
+        Runs detection and encoding in worker processes, away from the GUI and
+        capture threads, so TensorFlow, PyTorch and Qt do not share one GIL.
+
+        Frames are copied into shared memory slots; only the slot name, shape
+        and dtype are queued, and each result is a small record of faces and
+        float32 embeddings. Each worker has its own task queue, so the frames
+        of a worker that dies can be reclaimed and the worker restarted.
+
+        Parameters:
+        - workers: Number of worker processes.
+        - slots: Number of shared frame buffers, i.e. frames in flight. A frame
+          submitted while every slot is busy is dropped.
+        """
+        self.workers = workers
+        self.slot_count = slots
+        self.context = mp.get_context("spawn")
+        self.task_queues = []
+        self.result_queue = None
+        self.processes = []
+        # Whether each worker loaded its models, and its tasks in flight
+        self.ready = []
+        self.worker_tasks = []
+        self.failed_workers = set()
+        self.threads = 1
+
+        self.slots = []
+        self.free_slots = []
+        self.in_flight = {}
+        self.submitted_at = {}
+        self._task_ids = itertools.count()
+
+        self.ready_workers = 0
+        self.dropped_frames = 0
+        self.restarted_workers = 0
+        # Faces dropped by the workers' quality gates, per reason
+        self.quality_skipped = {}
+
+    def _spawn(self, index: int):
+        """Start worker `index` with a new task queue."""
+        task_queue = self.context.Queue()
+        process = self.context.Process(
+            target=_detection_worker,
+            args=(
+                task_queue,
+                self.result_queue,
+                QUALITY_GATE_ENABLED,
+                ROI_DETECTION_ENABLED,
+                self.threads,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self.task_queues[index] = task_queue
+        self.processes[index] = process
+        self.ready[index] = False
+        self.worker_tasks[index] = set()
+
+    def start(self):
+        """Spawn the worker processes; they load the models in the background."""
+        if self.processes:
+            return
+        self.result_queue = self.context.Queue()
+        # The workers share the thread budget of the process
+        self.threads = max(1, (CPU_THREAD_BUDGET or usable_cores()) // self.workers)
+        self.task_queues = [None] * self.workers
+        self.processes = [None] * self.workers
+        self.ready = [False] * self.workers
+        self.worker_tasks = [None] * self.workers
+        for index in range(self.workers):
+            self._spawn(index)
+        print(f"INFO: Started {self.workers} detection worker processes")
+
+    def _reap(self):
+        """
+        Free the slots of the workers that died and restart them.
+
+        A worker that died before loading its models is not restarted, it
+        would most likely fail again on every frame.
+        """
+        for index, process in enumerate(self.processes):
+            if process.is_alive() or index in self.failed_workers:
+                continue
+
+            lost = self.worker_tasks[index]
+            for task_id in lost:
+                self.free_slots.append(self.in_flight.pop(task_id))
+                self.submitted_at.pop(task_id)
+            self.dropped_frames += len(lost)
+            metrics.increment("pool_frames_dropped", len(lost))
+            self.worker_tasks[index] = set()
+            print(
+                f"ERROR: Detection worker {process.pid} exited with code "
+                f"{process.exitcode}, {len(lost)} frames lost"
+            )
+
+            process.join()
+            self.task_queues[index].close()
+            if not self.ready[index]:
+                self.failed_workers.add(index)
+                continue
+            self.ready_workers -= 1
+            self._spawn(index)
+            self.restarted_workers += 1
+            metrics.increment("pool_workers_restarted")
+
+    def _slot_for(self, frame: np.ndarray):
+        """A free slot large enough for the frame, or None when all are busy."""
+        if not self.free_slots:
+            if len(self.slots) >= self.slot_count:
+                return None
+            slot = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            self.slots.append(slot)
+            return slot
+
+        slot = self.free_slots.pop()
+        if slot.size < frame.nbytes:
+            # The frame size changed, replace the slot at the same index so the
+            # workers close their mapping of the retired one
+            index = self.slots.index(slot)
+            slot.close()
+            slot.unlink()
+            slot = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            self.slots[index] = slot
+        return slot
+
+    def submit(self, frame: np.ndarray):
+        """
+        Copy a frame into a shared slot and queue it for detection.
+
+        Returns:
+        - task_id: Id of the task, or None when the frame was dropped because
+          the workers are not ready or every slot is busy.
+        """
+        if self.ready_workers == 0:
+            self.collect()
+        if self.ready_workers == 0:
+            self.dropped_frames += 1
+            return None
+
+        slot = self._slot_for(frame)
+        if slot is None:
+            self.dropped_frames += 1
+            metrics.increment("pool_frames_dropped")
+            return None
+
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)
+        view[...] = frame
+        del view
+
+        # The ready worker with the fewest frames in flight
+        worker = min(
+            (index for index, ready in enumerate(self.ready) if ready),
+            key=lambda index: len(self.worker_tasks[index]),
+        )
+        task_id = next(self._task_ids)
+        self.in_flight[task_id] = slot
+        self.submitted_at[task_id] = time.perf_counter()
+        self.worker_tasks[worker].add(task_id)
+        self.task_queues[worker].put(
+            (
+                task_id,
+                self.slots.index(slot),
+                slot.name,
+                frame.shape,
+                frame.dtype.str,
+            )
+        )
+        return task_id
+
+    def collect(self, timeout=None):
+        """
+        Gather the finished results and free their slots.
+
+        Parameters:
+        - timeout: Seconds to wait for a first result, None to not wait.
+
+        Returns:
+        - results: Result records (task_id, faces, embeddings, timings, error)
+          in completion order.
+        """
+        results = []
+        block = timeout is not None
+        while True:
+            try:
+                record = self.result_queue.get(block=block, timeout=timeout)
+            except queue.Empty:
+                break
+            block = False
+
+            if "ready" in record:
+                for index, process in enumerate(self.processes):
+                    if process.pid == record["ready"] and not self.ready[index]:
+                        self.ready[index] = True
+                        self.ready_workers += 1
+                continue
+
+            task_id = record["task_id"]
+            if task_id not in self.in_flight:
+                # Reclaimed when its worker died
+                continue
+            for tasks in self.worker_tasks:
+                tasks.discard(task_id)
+            self.free_slots.append(self.in_flight.pop(task_id))
+            round_trip = time.perf_counter() - self.submitted_at.pop(task_id)
+            for reason, count in record.get("quality_skipped", {}).items():
+                if count:
+                    self.quality_skipped[reason] = (
+                        self.quality_skipped.get(reason, 0) + count
+                    )
+                    metrics.increment(f"quality_skipped_{reason}", count)
+
+            if record["error"] is not None:
+                print(f"ERROR: Detection worker failed: {record['error']}")
+                continue
+            metrics.observe("detect", record["detect_seconds"])
+            metrics.observe("encode", record["encode_seconds"])
+            metrics.observe("pool_round_trip", round_trip)
+            results.append(record)
+
+        if self.processes:
+            self._reap()
+        return results
+
+    def close(self):
+        """Stop the workers and release the shared slots."""
+        if self.processes:
+            for task_queue, process in zip(self.task_queues, self.processes):
+                if process.is_alive():
+                    task_queue.put(None)
+            for process in self.processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            self.processes = []
+            self.task_queues = []
+            self.ready = []
+            self.worker_tasks = []
+            self.failed_workers = set()
+
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+        self.slots = []
+        self.free_slots = []
+        self.in_flight = {}
+        self.submitted_at = {}
+        self.ready_workers = 0
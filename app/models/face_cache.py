@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+from core import FACE_CACHE_PATH, FACE_CACHE_MAX_BYTES, metrics
+from .gallery import EMBEDDING_SIZE
+
+
+def config_fingerprint(config) -> str:
+    """Short hash of a JSON-serializable configuration."""
+    encoded = json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class FaceCache:
+    # Bump when the stored format or the pipeline output changes
+    VERSION = 1
+
+    def __init__(self, path=FACE_CACHE_PATH, max_bytes=FACE_CACHE_MAX_BYTES):
+        """
+        Persistent cache of the detected faces and embeddings of image files.
+
+        Entries are keyed by the SHA-256 of the file content plus a fingerprint
+        of the detector and encoder configuration, so a renamed photo still
+        hits and a configuration change misses. The least recently used
+        entries are evicted once the stored size exceeds `max_bytes`.
+
+        Parameters:
+        - path: SQLite file of the cache.
+        - max_bytes: Upper bound of the stored faces and embeddings in bytes.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS face_cache (
+                key TEXT PRIMARY KEY,
+                faces TEXT NOT NULL,
+                embeddings BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_face_cache_last_used "
+            "ON face_cache (last_used)"
+        )
+        self.connection.commit()
+
+    def key(self, content: bytes, fingerprint: str) -> str:
+        """Cache key of an image file content under a pipeline configuration."""
+        digest = hashlib.sha256(content).hexdigest()
+        return f"{digest}:{fingerprint}:{self.VERSION}"
+
+    def get(self, key: str):
+        """
+        Look up an entry and mark it as recently used.
+
+        Returns:
+        - entry: (faces, embeddings) with embeddings a float32 [N, 512] array,
+          or None on a miss.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT faces, embeddings FROM face_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                metrics.increment("face_cache_misses")
+                return None
+            self.connection.execute(
+                "UPDATE face_cache SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self.connection.commit()
+
+        metrics.increment("face_cache_hits")
+        faces = json.loads(row[0])
+        for face in faces:
+            face["keypoints"] = {
+                name: tuple(point) for name, point in face["keypoints"].items()
+            }
+        embeddings = np.frombuffer(row[1], dtype=np.float32).reshape(-1, EMBEDDING_SIZE)
+        return faces, embeddings
+
+    def put(self, key: str, faces, embeddings):
+        """
+        Store the faces of an image with one embedding per face.
+
+        Parameters:
+        - key: Cache key, see `key`.
+        - faces: Detected faces (box, confidence, keypoints).
+        - embeddings: Array-like of shape [N, 512].
+        """
+        stored_faces = json.dumps(
+            [
+                {
+                    "box": [int(v) for v in face["box"]],
+                    "confidence": float(face.get("confidence", 0.0)),
+                    "keypoints": {
+                        name: [int(v) for v in point]
+                        for name, point in face["keypoints"].items()
+                    },
+                }
+                for face in faces
+            ]
+        )
+        blob = (
+            np.asarray(embeddings, dtype=np.float32)
+            .reshape(-1, EMBEDDING_SIZE)
+            .tobytes()
+        )
+        size = len(stored_faces) + len(blob)
+
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO face_cache VALUES (?, ?, ?, ?, ?)",
+                (key, stored_faces, blob, size, time.time()),
+            )
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        """Delete the least recently used entries until the size bound holds."""
+        (total,) = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM face_cache"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        # Evict down to 90% of the bound so eviction does not run on every put
+        excess = total - int(self.max_bytes * 0.9)
+        evicted = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM face_cache ORDER BY last_used"
+        ):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM face_cache WHERE key = ?", evicted)
+        metrics.increment("face_cache_evictions", len(evicted))
+
+    def stats(self):
+        """Number of entries and their stored size in bytes."""
+        with self._lock:
+            count, total = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM face_cache"
+            ).fetchone()
+        return {"entries": count, "bytes": total}
+
+    def clear(self):
+        """Delete every entry."""
+        with self._lock:
+            self.connection.execute("DELETE FROM face_cache")
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
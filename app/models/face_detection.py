@@ -2,57 +2,289 @@ import cv2
 import torch
 import numpy as np
 import torch.nn.functional as F
-from cv_models import MTCNNFaceDetector, FaceEncoder
+from cv_models import FaceEncoder, ROIFaceDetector, create_face_detector
+from core import (
+    QUALITY_GATE_ENABLED,
+    DETECTION_THRESHOLD,
+    FACE_CACHE_ENABLED,
+    metrics,
+)
+from .gallery import (
+    build_gallery,
+    create_compressed_gallery,
+    create_sharded_gallery,
+    embedding_to_array,
+)
+from .face_cache import FaceCache, config_fingerprint
+from .face_tracker import FaceTracker
+from .face_quality import FaceQualityGate
 
 
 class FaceDetection:
-    def __init__(self):
-        self.face_detector = MTCNNFaceDetector()
-        self.encoder = FaceEncoder()
+    def __init__(self, load_models=True, quality_gate=QUALITY_GATE_ENABLED):
+        """
+        Parameters:
+        - load_models: Load the detector and encoder. Without them only the
+          matching and drawing of faces encoded elsewhere (see `annotate`) work.
+        - quality_gate: Drop low quality faces before encoding them.
+        """
+        self.face_detector = None
+        self.encoder = None
+        self.quality_gate = None
+        self.cache = None
+        if load_models:
+            self.face_detector = create_face_detector()
+            self.encoder = FaceEncoder()
+            self.quality_gate = FaceQualityGate() if quality_gate else None
+            self.cache = FaceCache() if FACE_CACHE_ENABLED else None
 
         self.user_list = None
+        self.gallery = None
+        self.sharded_gallery = create_sharded_gallery()
+        self.compressed_gallery = create_compressed_gallery()
+        self.tracker = None
+        self.last_faces = []
 
     def detect_user(self, user_list):
-        self.user_list = user_list
+        # Decode and stack the embeddings only when the list changes
+        if user_list is not self.user_list:
+            self.user_list = user_list
+            self.gallery = build_gallery(
+                user_list, self.sharded_gallery, self.compressed_gallery
+            )
+            if self.tracker is not None:
+                self.tracker.reset()
 
-    def detect_faces(self, data: np.ndarray):
+    def use_gallery(self, gallery):
+        """
+        Match against a prepared gallery, e.g. the current snapshot of a
+        LiveFaceGallery; taking a new snapshot per frame is cheap.
+        """
+        if gallery is not self.gallery:
+            self.gallery = gallery
+            self.user_list = None
+            if self.tracker is not None:
+                self.tracker.reset()
+
+    def enable_tracking(self, enabled: bool):
+        """Reuse recognized identities of tracked faces across frames."""
+        self.tracker = FaceTracker() if enabled else None
+
+    def enable_roi_detection(self, enabled: bool):
+        """Search the faces of a video stream around their previous boxes."""
+        if self.face_detector is None:
+            return
+        wrapped = isinstance(self.face_detector, ROIFaceDetector)
+        if enabled and not wrapped:
+            self.face_detector = ROIFaceDetector(self.face_detector)
+        elif not enabled and wrapped:
+            self.face_detector = self.face_detector.detector
+
+    def detect_faces(self, data: np.ndarray, in_place=False):
         """
         Detect faces from either an image or video frame data and add bounding box.
 
         Parameters:
         - data: Either an image (NumPy array) or a video frame (NumPy array).
+        - in_place: Draw on `data` instead of a copy, for callers that own the
+          frame and only display the result (the camera loop).
 
         Returns:
         - image_with_boxes: The frame/image with bounding boxes drawn.
-        - encoded_face: Encoded face.
+        - encoded_face: Encoded face. With tracking enabled, faces whose
+          identity was reused from their track are not encoded and are None.
         """
         if isinstance(data, np.ndarray):
-            # Detect faces in the image/frame
-            faces = self.face_detector.detect_faces(data)
-
-            encoded_face = self.encoder.process_faces(data, faces)
-            # Draw bounding boxes on the image/frame
-
-            image_with_names = self.draw_predicted_name(faces, encoded_face, data)
-            image_with_boxes = self.draw_faces(faces, image_with_names)
+            with metrics.timed("pipeline"):
+                # Detect faces in the image/frame
+                with metrics.timed("detect"):
+                    faces = self.face_detector.detect_faces(data)
+                metrics.increment("faces_detected", len(faces))
+
+                # Drop tiny, blurred, rotated or uncertain faces before encoding
+                if self.quality_gate is not None:
+                    with metrics.timed("quality"):
+                        faces = self.quality_gate.filter(data, faces)
+                self.last_faces = faces
+
+                if self.tracker is not None and self.gallery is not None:
+                    encoded_face, face_matches = self.identify_tracked_faces(
+                        data, faces
+                    )
+                else:
+                    encoded_face = self.encoder.process_faces(data, faces)
+                    face_matches = self.identify_faces(encoded_face)
+
+                # Draw bounding boxes on the image/frame
+                with metrics.timed("draw"):
+                    image = data if in_place else data.copy()
+                    image_with_names = self.draw_matches(faces, face_matches, image)
+                    image_with_boxes = self.draw_faces(
+                        faces, image_with_names, copy=False
+                    )
 
             return image_with_boxes, encoded_face
         else:
             print("ERROR: Unsupported data type. Expected a NumPy array.")
             return None
 
-    def draw_faces(self, faces, image):
+    def detect_faces_batch(self, frames, in_place=False):
+        """
+        Detect, encode and identify the faces of several images or frames, e.g.
+        from an offline job or several cameras.
+
+        Frames of the same shape are detected together and the faces of every
+        frame are encoded in a single forward pass. Tracking is not applied,
+        since the frames need not come from one camera.
+
+        Parameters:
+        - frames: List (or stacked array) of images/frames (NumPy arrays).
+        - in_place: Draw on the frames instead of copies, see detect_faces.
+
+        Returns:
+        - results: One (image_with_boxes, encoded_face) per frame like
+          detect_faces, in the same order; None for a frame that is not a
+          NumPy array.
+        """
+        results = [None] * len(frames)
+        indices = [i for i, frame in enumerate(frames) if isinstance(frame, np.ndarray)]
+        if len(indices) < len(frames):
+            print("ERROR: Unsupported data type. Expected a NumPy array.")
+        if not indices:
+            return results
+        images = [frames[i] for i in indices]
+
+        with metrics.timed("pipeline_batch"):
+            with metrics.timed("detect_batch"):
+                faces_per_image = self.face_detector.detect_faces_batch(images)
+            metrics.increment(
+                "faces_detected", sum(len(faces) for faces in faces_per_image)
+            )
+
+            if self.quality_gate is not None:
+                with metrics.timed("quality"):
+                    faces_per_image = [
+                        self.quality_gate.filter(image, faces)
+                        for image, faces in zip(images, faces_per_image)
+                    ]
+
+            encoded_per_image = self.encoder.process_frames(images, faces_per_image)
+
+            for i, image, faces, encoded_face in zip(
+                indices, images, faces_per_image, encoded_per_image
+            ):
+                face_matches = self.identify_faces(encoded_face)
+                with metrics.timed("draw"):
+                    image = image if in_place else image.copy()
+                    image_with_names = self.draw_matches(faces, face_matches, image)
+                    image_with_boxes = self.draw_faces(
+                        faces, image_with_names, copy=False
+                    )
+                results[i] = (image_with_boxes, encoded_face)
+
+        return results
+
+    def cache_fingerprint(self) -> str:
+        """Fingerprint of the settings that change the faces and embeddings."""
+        gate = self.quality_gate
+        return config_fingerprint(
+            {
+                "detector": type(self.face_detector).__name__,
+                "detector_config": getattr(self.face_detector, "CONFIG", None),
+                "quality_gate": (
+                    None
+                    if gate is None
+                    else [
+                        gate.min_face_size,
+                        gate.min_confidence,
+                        gate.min_sharpness,
+                        gate.max_roll_degrees,
+                        gate.max_yaw_ratio,
+                    ]
+                ),
+                "encoder": [type(self.encoder.model).__name__, "vggface2"],
+                "face_size": self.encoder.FACE_SIZE,
+            }
+        )
+
+    def detect_faces_in_file(self, path: str):
+        """
+        Detect and encode the faces of an image file, using the face cache.
+
+        Parameters:
+        - path: Path to the image file.
+
+        Returns:
+        - (image_with_boxes, encoded_face) like detect_faces, or None when the
+          file cannot be read as an image.
+        """
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+
+        # The decoded image is ours, no need to draw on a copy
+        if self.cache is None:
+            return self.detect_faces(image, in_place=True)
+
+        key = self.cache.key(content, self.cache_fingerprint())
+        entry = self.cache.get(key)
+        if entry is None:
+            image_with_boxes, encoded_face = self.detect_faces(image, in_place=True)
+            # Faces identified from their track have no embedding to store
+            if all(embedding is not None for embedding in encoded_face):
+                self.cache.put(
+                    key,
+                    self.last_faces,
+                    [embedding_to_array(embedding) for embedding in encoded_face],
+                )
+            return image_with_boxes, encoded_face
+
+        faces, embeddings = entry
+        encoded_face = [torch.from_numpy(row.copy())[None] for row in embeddings]
+        return (
+            self.annotate(image, faces, encoded_face, in_place=True),
+            encoded_face,
+        )
+
+    def annotate(self, image, faces, encoded_face, in_place=False):
+        """
+        Identify faces detected and encoded elsewhere and draw them.
+
+        Parameters:
+        - image: Image/frame to draw on.
+        - faces: List of detected faces.
+        - encoded_face: One embedding (tensor or array) per face.
+        - in_place: Draw on `image` instead of a copy, see detect_faces.
+
+        Returns:
+        - image_with_boxes: The image with boxes and names drawn.
+        """
+        self.last_faces = faces
+        face_matches = self.identify_faces(encoded_face)
+
+        with metrics.timed("draw"):
+            image = image if in_place else image.copy()
+            image_with_names = self.draw_matches(faces, face_matches, image)
+            return self.draw_faces(faces, image_with_names, copy=False)
+
+    def draw_faces(self, faces, image, copy=True):
         """
         Draw bounding boxes, landmarks, and additional information around detected faces on the image.
 
         Parameters:
         - faces: List of detected faces.
         - image: Original image/frame.
+        - copy: Draw on a copy to keep the original image unchanged.
 
         Returns:
         - image_with_boxes: Image/frame with bounding boxes, landmarks, and information.
         """
-        image_with_boxes = image.copy()  # To keep the original image unchanged
+        image_with_boxes = image.copy() if copy else image
 
         # Draw bounding boxes around faces
         image_with_boxes = self.draw_bounding_boxes(faces, image_with_boxes)
@@ -114,6 +346,50 @@ class FaceDetection:
         similarity = F.cosine_similarity(face, image, dim=1).item()
         return similarity > threshold, similarity
 
+    def identify_faces(self, embeddings, threshold: float = DETECTION_THRESHOLD):
+        """
+        Match each embedding against the gallery.
+
+        Returns:
+        - face_matches: One list of (gallery index, similarity) per embedding.
+        """
+        if self.gallery is None:
+            return [[] for _ in embeddings]
+        with metrics.timed("match"):
+            return [
+                self.gallery.match(embedding, threshold) for embedding in embeddings
+            ]
+
+    def identify_tracked_faces(
+        self, image, faces, threshold: float = DETECTION_THRESHOLD
+    ):
+        """
+        Identify faces, encoding only those whose track has no confident,
+        recent identity.
+
+        Returns:
+        - encoded_faces: Encoding per face, None where the identity was reused.
+        - face_matches: One list of (gallery index, similarity) per face.
+        """
+        tracks = self.tracker.update(faces)
+        pending = [
+            i for i, track in enumerate(tracks) if self.tracker.needs_encoding(track)
+        ]
+
+        encoded_faces = [None] * len(faces)
+        embeddings = self.encoder.process_faces(image, [faces[i] for i in pending])
+        with metrics.timed("match"):
+            for i, embedding in zip(pending, embeddings):
+                encoded_faces[i] = embedding
+                self.tracker.set_identity(
+                    tracks[i], self.gallery.match(embedding, threshold)
+                )
+
+        self.tracker.stats["encoded"] += len(pending)
+        self.tracker.stats["reused"] += len(faces) - len(pending)
+        metrics.increment("identities_reused", len(faces) - len(pending))
+        return encoded_faces, [track.matches for track in tracks]
+
     def draw_predicted_name(self, faces, embeddings, image):
         """
         Draw predicted face name with percentage .
@@ -123,6 +399,20 @@ class FaceDetection:
         - embeddings: Original embedding lists .
         - image: Original image/frame.
 
+        Returns:
+        - image_with_info: Image/frame with information drawn.
+        """
+        return self.draw_matches(faces, self.identify_faces(embeddings), image)
+
+    def draw_matches(self, faces, face_matches, image):
+        """
+        Draw the names of the gallery matches of each face.
+
+        Parameters:
+        - faces: List of detected faces.
+        - face_matches: One list of (gallery index, similarity) per face.
+        - image: Original image/frame.
+
         Returns:
         - image_with_info: Image/frame with information drawn.
         """
@@ -130,36 +420,22 @@ class FaceDetection:
         font = cv2.FONT_HERSHEY_SIMPLEX
         thickness = 2
 
-        if self.user_list is None:
+        if self.gallery is None:
             return image
 
-        for user in self.user_list:
-            decoded_embedding = user.decode_embedding()
-
-            match = False
-            if (
-                isinstance(decoded_embedding, list)
-                and len(decoded_embedding) > 0
-                and len(embeddings) > 0
-                and isinstance(decoded_embedding[0], torch.Tensor)
-            ):
-                for i, embedding in enumerate(embeddings):
-
-                    match, sim = self.match_face(
-                        decoded_embedding[0], embedding, threshold=0.7
-                    )
-                    x, y, w, h = faces[i]["box"]
-                    if match:
-                        cv2.putText(
-                            image,
-                            f"{user.user_name} Sim: {sim:.2f}",
-                            (x + 200, y - 10),
-                            font,
-                            1,
-                            green,
-                            thickness,
-                            cv2.LINE_AA,
-                        )
+        for face, matches in zip(faces, face_matches):
+            x, y, w, h = face["box"]
+            for index, sim in matches:
+                cv2.putText(
+                    image,
+                    f"{self.gallery.user_names[index]} Sim: {sim:.2f}",
+                    (x + 200, y - 10),
+                    font,
+                    1,
+                    green,
+                    thickness,
+                    cv2.LINE_AA,
+                )
 
         return image
 
@@ -0,0 +1,139 @@
+import math
+import cv2
+import numpy as np
+
+from core import (
+    QUALITY_MIN_FACE_SIZE,
+    QUALITY_MIN_CONFIDENCE,
+    QUALITY_MIN_SHARPNESS,
+    QUALITY_MAX_ROLL_DEGREES,
+    QUALITY_MAX_YAW_RATIO,
+    metrics,
+)
+
+
+class FaceQualityGate:
+    # Checks in the order they run, cheapest first
+    REASONS = ("confidence", "size", "pose", "sharpness")
+
+    # Side of the face crop used to measure sharpness, keeps it scale independent
+    SHARPNESS_SIZE = 64
+
+    def __init__(
+        self,
+        min_face_size=QUALITY_MIN_FACE_SIZE,
+        min_confidence=QUALITY_MIN_CONFIDENCE,
+        min_sharpness=QUALITY_MIN_SHARPNESS,
+        max_roll_degrees=QUALITY_MAX_ROLL_DEGREES,
+        max_yaw_ratio=QUALITY_MAX_YAW_RATIO,
+    ):
+        """
+        Cheap quality checks run between detection and encoding.
+
+        Parameters:
+        - min_face_size: Minimum width and height of the face box in pixels.
+        - min_confidence: Minimum detector confidence.
+        - min_sharpness: Minimum variance of the Laplacian of the face crop.
+        - max_roll_degrees: Maximum in-plane rotation of the eye line.
+        - max_yaw_ratio: Maximum horizontal nose offset from the eye midpoint,
+          relative to the distance between the eyes.
+        """
+        self.min_face_size = min_face_size
+        self.min_confidence = min_confidence
+        self.min_sharpness = min_sharpness
+        self.max_roll_degrees = max_roll_degrees
+        self.max_yaw_ratio = max_yaw_ratio
+
+        self.passed = 0
+        self.skipped = dict.fromkeys(self.REASONS, 0)
+
+    @staticmethod
+    def pose(face):
+        """
+        Estimate the head pose from the landmarks.
+
+        Returns:
+        - roll: Angle of the eye line in degrees.
+        - yaw: Horizontal nose offset relative to the eye distance.
+        """
+        keypoints = face.get("keypoints", {})
+        if not {"left_eye", "right_eye", "nose"} <= keypoints.keys():
+            return 0.0, 0.0
+
+        (lx, ly), (rx, ry) = keypoints["left_eye"], keypoints["right_eye"]
+        nose_x, _ = keypoints["nose"]
+        eye_distance = math.hypot(rx - lx, ry - ly)
+        if eye_distance == 0:
+            return 0.0, float("inf")
+
+        roll = math.degrees(math.atan2(ry - ly, rx - lx))
+        yaw = (nose_x - (lx + rx) / 2.0) / eye_distance
+        return roll, yaw
+
+    def sharpness(self, image, face) -> float:
+        """Variance of the Laplacian of the face crop, resized to a fixed size."""
+        x, y, w, h = face["box"]
+        img_h, img_w = image.shape[:2]
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(img_w, x + w), min(img_h, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return 0.0
+
+        crop = cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        crop = cv2.resize(
+            crop,
+            (self.SHARPNESS_SIZE, self.SHARPNESS_SIZE),
+            interpolation=cv2.INTER_AREA,
+        )
+        return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+    def check(self, image, face):
+        """
+        Run the quality checks on one face.
+
+        Returns:
+        - reason: Name of the first failed check, or None if the face passes.
+        """
+        if face.get("confidence", 1.0) < self.min_confidence:
+            return "confidence"
+
+        _, _, w, h = face["box"]
+        if min(w, h) < self.min_face_size:
+            return "size"
+
+        roll, yaw = self.pose(face)
+        if abs(roll) > self.max_roll_degrees or abs(yaw) > self.max_yaw_ratio:
+            return "pose"
+
+        if self.sharpness(image, face) < self.min_sharpness:
+            return "sharpness"
+
+        return None
+
+    def filter(self, image: np.ndarray, faces):
+        """
+        Keep the faces worth encoding and count the skipped ones per reason,
+        also exported as the `quality_skipped_<reason>` metrics counters.
+
+        Parameters:
+        - image: Frame the faces were detected in.
+        - faces: List of detected faces.
+
+        Returns:
+        - faces: The faces that passed every check.
+        """
+        kept = []
+        for face in faces:
+            reason = self.check(image, face)
+            if reason is None:
+                kept.append(face)
+                self.passed += 1
+            else:
+                self.skipped[reason] += 1
+                metrics.increment(f"quality_skipped_{reason}")
+        return kept
+
+    def reset_stats(self):
+        """Reset the passed and skipped counters."""
+        self.passed = 0
+        self.skipped = dict.fromkeys(self.REASONS, 0)
@@ -0,0 +1,133 @@
+from core import (
+    TRACK_IOU_THRESHOLD,
+    TRACK_MAX_MISSED,
+    TRACK_REVERIFY_FRAMES,
+    TRACK_CONFIDENT_SIMILARITY,
+)
+
+
+def box_iou(box_a, box_b) -> float:
+    """Intersection over union of two [x, y, w, h] boxes."""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = inter_w * inter_h
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    def __init__(self, track_id: int, box):
+        """
+        A face followed across consecutive frames.
+
+        Parameters:
+        - track_id: Unique id of the track.
+        - box: Last known [x, y, w, h] box of the face.
+        """
+        self.track_id = track_id
+        self.box = box
+        self.missed = 0
+
+        # Cached identity: list of (gallery index, similarity) matches
+        self.matches = None
+        self.verified_frame = None
+
+
+class FaceTracker:
+    def __init__(
+        self,
+        iou_threshold=TRACK_IOU_THRESHOLD,
+        max_missed=TRACK_MAX_MISSED,
+        reverify_frames=TRACK_REVERIFY_FRAMES,
+        confident_similarity=TRACK_CONFIDENT_SIMILARITY,
+    ):
+        """
+        Associates detected faces with tracks so a recognized identity can be
+        reused on later frames instead of re-encoding the face.
+
+        Parameters:
+        - iou_threshold: Minimum box overlap to continue a track.
+        - max_missed: Frames a track survives without a matching face.
+        - reverify_frames: Frames after which a cached identity is re-checked.
+        - confident_similarity: Similarity above which an identity is cached.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reverify_frames = reverify_frames
+        self.confident_similarity = confident_similarity
+
+        self.tracks = []
+        self.frame_index = 0
+        self._next_id = 1
+        self.stats = {"encoded": 0, "reused": 0}
+
+    def update(self, faces):
+        """
+        Match the faces of a new frame to the existing tracks.
+
+        Parameters:
+        - faces: List of detected faces.
+
+        Returns:
+        - tracks: One FaceTrack per face, in the same order.
+        """
+        self.frame_index += 1
+
+        # Greedy association, best overlapping pairs first
+        pairs = sorted(
+            (
+                (box_iou(track.box, face["box"]), t, f)
+                for t, track in enumerate(self.tracks)
+                for f, face in enumerate(faces)
+            ),
+            reverse=True,
+        )
+        assigned = [None] * len(faces)
+        used_tracks = set()
+        for iou, t, f in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in used_tracks or assigned[f] is not None:
+                continue
+            used_tracks.add(t)
+            assigned[f] = self.tracks[t]
+
+        # Age the tracks that lost their face, drop the ones gone too long
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed += 1
+        self.tracks = [
+            track for track in self.tracks if track.missed <= self.max_missed
+        ]
+
+        for f, face in enumerate(faces):
+            track = assigned[f]
+            if track is None:
+                track = FaceTrack(self._next_id, face["box"])
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[f] = track
+            track.box = face["box"]
+            track.missed = 0
+
+        return assigned
+
+    def needs_encoding(self, track: FaceTrack) -> bool:
+        """Whether the face of a track has to be encoded on this frame."""
+        if track.matches is None or track.verified_frame is None:
+            return True
+        if self.frame_index - track.verified_frame >= self.reverify_frames:
+            return True
+        best = max((sim for _, sim in track.matches), default=0.0)
+        return best < self.confident_similarity
+
+    def set_identity(self, track: FaceTrack, matches):
+        """Cache the gallery matches of a freshly encoded track."""
+        track.matches = matches
+        track.verified_frame = self.frame_index
+
+    def reset(self):
+        """Forget every track, e.g. when the gallery changes."""
+        self.tracks = []
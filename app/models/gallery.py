@@ -0,0 +1,615 @@
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+from core import (
+    GALLERY_COMPRESSION,
+    GALLERY_PCA_COMPONENTS,
+    GALLERY_SHORTLIST,
+    GALLERY_EXACT_PATH,
+    GALLERY_SHARDS,
+    GALLERY_SHARD_MIN_USERS,
+    DETECTION_THRESHOLD,
+    IDENTIFICATION_TOP_K,
+    IDENTIFICATION_MIN_MARGIN,
+)
+
+EMBEDDING_SIZE = 512
+
+
+def embedding_to_array(embedding) -> np.ndarray:
+    """
+    Flatten an embedding to a float32 vector.
+
+    Parameters:
+    - embedding: Tensor, NumPy array, or the stored list of tensors.
+
+    Returns:
+    - vector: 1D float32 NumPy array.
+    """
+    if isinstance(embedding, (list, tuple)):
+        embedding = embedding[0]
+    if isinstance(embedding, torch.Tensor):
+        embedding = embedding.detach().cpu().numpy()
+    return np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so dot products are cosine similarities."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def probe_matrix(probes) -> np.ndarray:
+    """
+    Normalized float32 [Q, 512] matrix of probe embeddings.
+
+    Parameters:
+    - probes: One embedding, a list of embeddings, or an array [Q, 512].
+    """
+    if isinstance(probes, (list, tuple)):
+        probes = np.stack([embedding_to_array(probe) for probe in probes])
+    elif isinstance(probes, torch.Tensor):
+        probes = probes.detach().cpu().numpy()
+    probes = np.asarray(probes, dtype=np.float32).reshape(-1, EMBEDDING_SIZE)
+    return normalize_rows(probes)
+
+
+def empty_top_k(count: int):
+    """top_k result of `count` probes against an empty gallery."""
+    return (
+        np.empty((count, 0), dtype=np.int64),
+        np.empty((count, 0), dtype=np.float32),
+    )
+
+
+def top_k_of_scores(scores: np.ndarray, k: int):
+    """
+    Best k columns of each row of a score matrix, best first.
+
+    argpartition selects the k best in linear time, only they are sorted.
+    """
+    if k < scores.shape[1]:
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(top, order, axis=1),
+        np.take_along_axis(top_scores, order, axis=1),
+    )
+
+
+class FaceGallery:
+    def __init__(self, user_ids, user_names, embeddings):
+        """
+        Enrolled face embeddings stacked into one normalized float32 matrix.
+
+        Parameters:
+        - user_ids: Database ids of the enrolled users.
+        - user_names: User names, in the same order.
+        - embeddings: Array of shape [N, 512], one embedding per user.
+        """
+        self.user_ids = list(user_ids)
+        self.user_names = list(user_names)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.embeddings = normalize_rows(
+            embeddings.reshape(len(self.user_ids), EMBEDDING_SIZE)
+        )
+
+    @classmethod
+    def from_users(cls, users):
+        """Decode the stored embedding of each user once and build a gallery."""
+        user_ids, user_names, rows = [], [], []
+
+        for user in users:
+            decoded_embedding = user.decode_embedding()
+            if (
+                isinstance(decoded_embedding, list)
+                and len(decoded_embedding) > 0
+                and isinstance(decoded_embedding[0], torch.Tensor)
+            ):
+                user_ids.append(user.id)
+                user_names.append(user.user_name)
+                rows.append(embedding_to_array(decoded_embedding))
+
+        if not rows:
+            return cls([], [], np.empty((0, EMBEDDING_SIZE), dtype=np.float32))
+        return cls(user_ids, user_names, np.stack(rows))
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of the embedding matrix in bytes."""
+        return self.embeddings.nbytes
+
+    def scores(self, embedding) -> np.ndarray:
+        """Cosine similarity of an embedding against every enrolled user."""
+        probe = normalize_rows(embedding_to_array(embedding))
+        return self.embeddings @ probe
+
+    def match(self, embedding, threshold: float):
+        """
+        Find the enrolled users whose similarity exceeds the threshold.
+
+        Returns:
+        - matches: List of (index, similarity) tuples in gallery order.
+        """
+        if len(self) == 0:
+            return []
+        scores = self.scores(embedding)
+        return [(int(i), float(scores[i])) for i in np.flatnonzero(scores > threshold)]
+
+    def best_match(self, embedding):
+        """Return (index, similarity) of the most similar user, or (None, 0.0)."""
+        if len(self) == 0:
+            return None, 0.0
+        scores = self.scores(embedding)
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+    def top_k(self, probes, k: int):
+        """
+        Most similar users of each probe.
+
+        Parameters:
+        - probes: Embeddings, array-like of shape [Q, 512] (or one embedding).
+        - k: Number of candidates per probe.
+
+        Returns:
+        - indices: Gallery indices, int array [Q, k], best first.
+        - scores: Cosine similarities, float32 array [Q, k].
+        """
+        probes = probe_matrix(probes)
+        k = min(k, len(self))
+        if k == 0:
+            return empty_top_k(len(probes))
+        return top_k_of_scores(probes @ self.embeddings.T, k)
+
+
+class CompressedFaceGallery:
+    # Rows scored per block, bounds the float32 scratch of the int8 product
+    BLOCK_SIZE = 8192
+
+    def __init__(
+        self,
+        user_ids,
+        user_names,
+        mean,
+        components,
+        codes,
+        scales,
+        mean_scores,
+        exact,
+        shortlist=GALLERY_SHORTLIST,
+    ):
+        """
+        Gallery stored as a PCA projection with per-vector int8 quantization.
+
+        Candidates are ranked with approximate scores computed from the int8
+        codes, then the shortlist is re-scored exactly against the float32
+        embeddings, which may be a read-only memory map shared by processes.
+
+        Parameters:
+        - user_ids: Database ids of the enrolled users.
+        - user_names: User names, in the same order.
+        - mean: Mean embedding, shape [512].
+        - components: PCA projection, shape [k, 512].
+        - codes: Quantized projections, int8 array of shape [N, k].
+        - scales: Per-vector quantization scales, shape [N].
+        - mean_scores: Dot product of each embedding with the mean, shape [N].
+        - exact: Normalized float32 embeddings (array or memory map), [N, 512].
+        - shortlist: Number of approximate candidates re-scored exactly.
+        """
+        self.user_ids = list(user_ids)
+        self.user_names = list(user_names)
+        self.mean = mean
+        self.components = components
+        self.codes = codes
+        self.scales = scales
+        self.mean_scores = mean_scores
+        self.exact = exact
+        self.shortlist = shortlist
+
+    @classmethod
+    def from_gallery(
+        cls,
+        gallery: FaceGallery,
+        n_components=GALLERY_PCA_COMPONENTS,
+        exact_path=None,
+        shortlist=GALLERY_SHORTLIST,
+    ):
+        """
+        Learn a PCA projection of a gallery and quantize it to int8.
+
+        Parameters:
+        - gallery: Exact gallery to compress.
+        - n_components: Dimension of the PCA projection.
+        - exact_path: Optional .npy path; the exact embeddings are written there
+          and memory-mapped instead of being kept in RAM. Each gallery maps its
+          own file, which then replaces the path, so galleries built
+          concurrently never truncate a file another one has mapped.
+        - shortlist: Number of approximate candidates re-scored exactly.
+        """
+        embeddings = gallery.embeddings
+        mean = embeddings.mean(axis=0) if len(gallery) else embeddings.sum(axis=0)
+        centered = embeddings - mean
+
+        # Principal axes from the D x D covariance, largest variance first
+        _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        n_components = min(n_components, embeddings.shape[1])
+        components = np.ascontiguousarray(
+            eigenvectors[:, ::-1][:, :n_components].T, dtype=np.float32
+        )
+
+        projected = centered @ components.T
+        scales = np.abs(projected).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(projected / scales[:, None]).astype(np.int8)
+
+        exact = embeddings
+        if exact_path:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(exact_path)), suffix=".npy"
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, embeddings)
+                # Map before the rename, the mapping keeps this file's data even
+                # after a later build replaces the path
+                exact = np.load(tmp_path, mmap_mode="r")
+                os.replace(tmp_path, exact_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        return cls(
+            gallery.user_ids,
+            gallery.user_names,
+            mean.astype(np.float32),
+            components,
+            codes,
+            scales.astype(np.float32),
+            (embeddings @ mean).astype(np.float32),
+            exact,
+            shortlist=shortlist,
+        )
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def compressed_nbytes(self) -> int:
+        """Size in bytes of the compressed representation alone."""
+        return (
+            self.mean.nbytes
+            + self.components.nbytes
+            + self.codes.nbytes
+            + self.scales.nbytes
+            + self.mean_scores.nbytes
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Resident size in bytes: the compressed arrays, plus the exact matrix
+        when it is held in memory (a memory map is paged in on demand, only
+        the re-scored rows are read).
+        """
+        if isinstance(self.exact, np.memmap):
+            return self.compressed_nbytes
+        return self.compressed_nbytes + self.exact.nbytes
+
+    def approximate_scores(self, embedding) -> np.ndarray:
+        """
+        Approximate cosine similarities from the int8 codes.
+
+        For unit vectors, q.x = (q - m).(x - m) + m.x + m.q - m.m, and the first
+        term is approximated in the PCA space.
+        """
+        probe = normalize_rows(embedding_to_array(embedding))
+        projected_probe = self.components @ (probe - self.mean)
+        offset = float(self.mean @ probe - self.mean @ self.mean)
+
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), self.BLOCK_SIZE):
+            block = slice(start, start + self.BLOCK_SIZE)
+            scores[block] = self.codes[block].astype(np.float32) @ projected_probe
+        scores *= self.scales
+        scores += self.mean_scores + offset
+        return scores
+
+    def shortlist_scores(self, embedding, excluded=None):
+        """
+        Re-score the best approximate candidates exactly.
+
+        Parameters:
+        - embedding: Probe embedding.
+        - excluded: Optional gallery indices that are never shortlisted.
+
+        Returns:
+        - indices: Gallery indices of the finalists.
+        - scores: Exact cosine similarities of the finalists.
+        """
+        approximate = self.approximate_scores(embedding)
+        count = len(self)
+        if excluded is not None and len(excluded) > 0:
+            approximate[excluded] = -np.inf
+            count -= len(excluded)
+        k = min(self.shortlist, count)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if k < len(self):
+            indices = np.argpartition(approximate, -k)[-k:]
+        else:
+            indices = np.arange(len(self))
+        indices.sort()
+
+        probe = normalize_rows(embedding_to_array(embedding))
+        return indices, np.asarray(self.exact[indices]) @ probe
+
+    def match(self, embedding, threshold: float, excluded=None):
+        """
+        Find the enrolled users whose exact similarity exceeds the threshold,
+        among the approximate shortlist.
+
+        Returns:
+        - matches: List of (index, similarity) tuples in gallery order.
+        """
+        if len(self) == 0:
+            return []
+        indices, scores = self.shortlist_scores(embedding, excluded)
+        return [
+            (int(index), float(score))
+            for index, score in zip(indices, scores)
+            if score > threshold
+        ]
+
+    def best_match(self, embedding, excluded=None):
+        """Return (index, similarity) of the most similar user, or (None, 0.0)."""
+        if len(self) == 0:
+            return None, 0.0
+        indices, scores = self.shortlist_scores(embedding, excluded)
+        if len(indices) == 0:
+            return None, 0.0
+        best = int(np.argmax(scores))
+        return int(indices[best]), float(scores[best])
+
+    def top_k(self, probes, k: int, excluded=None):
+        """
+        Most similar users of each probe among its exact re-scored shortlist,
+        so at most `shortlist` candidates are returned.
+
+        Parameters:
+        - probes: Embeddings, array-like of shape [Q, 512] (or one embedding).
+        - k: Number of candidates per probe.
+        - excluded: Optional gallery indices that never match.
+
+        Returns:
+        - indices: Gallery indices, int array [Q, k], best first.
+        - scores: Cosine similarities, float32 array [Q, k].
+        """
+        probes = probe_matrix(probes)
+        count = len(self) - (0 if excluded is None else len(excluded))
+        k = min(k, self.shortlist, count)
+        if k <= 0:
+            return empty_top_k(len(probes))
+
+        indices = np.empty((len(probes), k), dtype=np.int64)
+        scores = np.empty((len(probes), k), dtype=np.float32)
+        for row, probe in enumerate(probes):
+            candidates, candidate_scores = self.shortlist_scores(probe, excluded)
+            top, top_scores = top_k_of_scores(candidate_scores[None], k)
+            indices[row] = candidates[top[0]]
+            scores[row] = top_scores[0]
+        return indices, scores
+
+
+class GallerySubset:
+    def __init__(self, gallery, excluded, count):
+        """
+        Users of a gallery restricted to a subset, e.g. the users not present
+        today, without building another gallery. Indices are those of the
+        full gallery.
+
+        Parameters:
+        - gallery: Gallery whose top_k, match and best_match take `excluded`.
+        - excluded: Unique gallery indices outside the subset.
+        - count: Number of users in the subset.
+        """
+        self.gallery = gallery
+        self.user_ids = gallery.user_ids
+        self.user_names = gallery.user_names
+        self.excluded = excluded
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def top_k(self, probes, k: int):
+        return self.gallery.top_k(probes, k, self.excluded)
+
+    def match(self, embedding, threshold: float):
+        return self.gallery.match(embedding, threshold, self.excluded)
+
+    def best_match(self, embedding):
+        return self.gallery.best_match(embedding, self.excluded)
+
+
+class CachedCompressedGallery:
+    def __init__(self, exact_path=GALLERY_EXACT_PATH):
+        """
+        CompressedFaceGallery kept across `build_gallery` calls.
+
+        The PCA, the int8 codes and the memory-mapped exact matrix cover every
+        user seen so far and are only rebuilt when a user is enrolled or gets
+        a new embedding; the users left out of a call are masked instead.
+
+        Parameters:
+        - exact_path: .npy path of the memory-mapped exact embeddings.
+        """
+        self.exact_path = exact_path
+        self.gallery = None
+        self.rows = {}
+        # Fingerprint of the stored embedding of each user seen so far
+        self.fingerprints = {}
+
+    def _rebuild(self, changed_users):
+        """Compress the current users again with the changed ones replaced."""
+        changed = FaceGallery.from_users(changed_users)
+        user_ids, user_names = changed.user_ids, changed.user_names
+        embeddings = changed.embeddings
+        if self.gallery is not None:
+            replaced = set(changed.user_ids)
+            keep = [
+                index
+                for index, user_id in enumerate(self.gallery.user_ids)
+                if user_id not in replaced
+            ]
+            # The exact rows are already normalized, only the changed users
+            # are decoded again
+            user_ids = [self.gallery.user_ids[index] for index in keep] + user_ids
+            user_names = [self.gallery.user_names[index] for index in keep] + user_names
+            embeddings = np.concatenate(
+                [np.asarray(self.gallery.exact[keep]), embeddings]
+            )
+
+        self.gallery = CompressedFaceGallery.from_gallery(
+            FaceGallery(user_ids, user_names, embeddings),
+            exact_path=self.exact_path,
+        )
+        self.rows = {user_id: index for index, user_id in enumerate(user_ids)}
+
+    def subset(self, users):
+        """
+        Rebuild if the enrolment changed and return a view that only matches
+        `users`.
+        """
+        changed = [
+            user
+            for user in users
+            if self.fingerprints.get(user.id) != hash(user.face_embedding)
+        ]
+        if changed or self.gallery is None:
+            self._rebuild(changed)
+            for user in changed:
+                self.fingerprints[user.id] = hash(user.face_embedding)
+
+        allowed = [self.rows[user.id] for user in users if user.id in self.rows]
+        excluded = np.ones(len(self.gallery), dtype=bool)
+        excluded[allowed] = False
+        return GallerySubset(self.gallery, np.flatnonzero(excluded), len(allowed))
+
+
+def create_compressed_gallery():
+    """
+    CachedCompressedGallery for a caller to keep across `build_gallery`
+    calls, or None when compression is disabled.
+    """
+    if not GALLERY_COMPRESSION:
+        return None
+    return CachedCompressedGallery()
+
+
+def create_sharded_gallery():
+    """
+    ShardedFaceGallery for a caller to keep across `build_gallery` calls, or
+    None when sharding is disabled. Its workers start on first use.
+    """
+    if GALLERY_SHARDS <= 0:
+        return None
+    from .sharded_gallery import ShardedFaceGallery
+
+    return ShardedFaceGallery(shards=GALLERY_SHARDS)
+
+
+def build_gallery(users, sharded=None, compressed=None):
+    """
+    Build the gallery configured in core.config from a list of users.
+
+    Parameters:
+    - users: List of `Users` records.
+    - sharded: Long-lived gallery from `create_sharded_gallery`. Lists of at
+      least GALLERY_SHARD_MIN_USERS users are matched through it, synced
+      instead of spawning and filling new workers on every call.
+    - compressed: Long-lived gallery from `create_compressed_gallery`, other
+      lists are matched through it instead of being compressed again.
+    """
+    if sharded is not None and len(users) >= GALLERY_SHARD_MIN_USERS:
+        return sharded.subset(users)
+    if compressed is not None and len(users) > 0:
+        return compressed.subset(users)
+    gallery = FaceGallery.from_users(users)
+    if GALLERY_COMPRESSION and len(gallery) > 0:
+        return CompressedFaceGallery.from_gallery(
+            gallery, exact_path=GALLERY_EXACT_PATH
+        )
+    return gallery
+
+
+def rank_candidates(gallery, embeddings, k=IDENTIFICATION_TOP_K):
+    """
+    Rank the gallery users for each embedding.
+
+    Parameters:
+    - gallery: FaceGallery, CompressedFaceGallery or ShardedFaceGallery.
+    - embeddings: Face embeddings (list of tensors or array [Q, 512]).
+    - k: Number of candidates per embedding.
+
+    Returns:
+    - rankings: One dict per embedding with the `candidates` as
+      (index, similarity) tuples, best first, and the `margin` between the
+      first and second similarity (the first similarity when there is only
+      one candidate).
+    """
+    if len(embeddings) == 0:
+        return []
+    indices, scores = gallery.top_k(embeddings, k)
+
+    rankings = []
+    for row_indices, row_scores in zip(indices, scores):
+        candidates = [
+            (int(index), float(score)) for index, score in zip(row_indices, row_scores)
+        ]
+        if len(candidates) > 1:
+            margin = candidates[0][1] - candidates[1][1]
+        elif candidates:
+            margin = candidates[0][1]
+        else:
+            margin = 0.0
+        rankings.append({"candidates": candidates, "margin": margin})
+    return rankings
+
+
+def unambiguous_match(
+    ranking, threshold=DETECTION_THRESHOLD, min_margin=IDENTIFICATION_MIN_MARGIN
+):
+    """
+    Best candidate of a ranking if it is both similar and clearly ahead.
+
+    Parameters:
+    - ranking: One result of `rank_candidates`.
+    - threshold: Minimum similarity of the best candidate.
+    - min_margin: Minimum lead of the best candidate over the second.
+
+    Returns:
+    - match: (index, similarity) of the best candidate, or None.
+    """
+    if not ranking["candidates"]:
+        return None
+    index, similarity = ranking["candidates"][0]
+    if similarity <= threshold:
+        return None
+    if ranking["margin"] < min_margin:
+        print(
+            f"INFO: Ambiguous match ignored, margin {ranking['margin']:.3f} "
+            f"below {min_margin:.3f}"
+        )
+        return None
+    return index, similarity
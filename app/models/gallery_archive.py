@@ -0,0 +1,178 @@
+import os
+import zipfile
+import hashlib
+
+import numpy as np
+import torch
+
+from cv_models.encoder_class import FaceEncoder
+from .gallery import EMBEDDING_SIZE, embedding_to_array
+from .user import Users, UserRepository
+
+
+class GalleryArchive:
+    # Bump when the arrays stored in the archive change
+    FORMAT_VERSION = 1
+
+    def __init__(self, repository: UserRepository):
+        """
+        Exports the enrolled users to a single .npz file and imports it into
+        another database, so kiosks can be provisioned without running the
+        models on the registration photos.
+
+        The archive holds the user ids, the UTF-8 names with their offsets,
+        the float32 embeddings [N, 512], the encoder model version and a
+        SHA-256 checksum of all of them. Nothing is pickled.
+
+        Parameters:
+        - repository: User repository to read from or write to.
+        """
+        self.repository = repository
+
+    @staticmethod
+    def checksum(arrays) -> str:
+        """SHA-256 of the archive arrays, in a fixed order."""
+        digest = hashlib.sha256()
+        for name in sorted(arrays):
+            value = np.ascontiguousarray(arrays[name])
+            digest.update(name.encode("utf-8"))
+            digest.update(str(value.dtype).encode("utf-8"))
+            digest.update(np.asarray(value.shape, dtype=np.int64).tobytes())
+            digest.update(value.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def encode_names(names):
+        """Concatenated UTF-8 bytes of the names and their end offsets."""
+        encoded = [name.encode("utf-8") for name in names]
+        offsets = np.cumsum([len(name) for name in encoded], dtype=np.int64)
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    @staticmethod
+    def decode_names(data: np.ndarray, offsets: np.ndarray):
+        data = data.tobytes()
+        starts = np.concatenate([[0], offsets[:-1]])
+        return [data[s:e].decode("utf-8") for s, e in zip(starts, offsets)]
+
+    def export(self, path):
+        """
+        Write the users with a face embedding to an archive.
+
+        Parameters:
+        - path: Output .npz file, replaced atomically.
+
+        Returns:
+        - count: Number of exported users.
+        """
+        user_ids, user_names, rows = [], [], []
+        for user in self.repository.get_all():
+            embedding = user.decode_embedding()
+            if not isinstance(embedding, list) or len(embedding) == 0:
+                print(f"WARNING: User {user.user_name} has no embedding, skipped.")
+                continue
+            user_ids.append(user.id)
+            user_names.append(user.user_name)
+            rows.append(embedding_to_array(embedding))
+
+        names, name_offsets = self.encode_names(user_names)
+        arrays = {
+            "format_version": np.asarray(self.FORMAT_VERSION, dtype=np.int64),
+            "model_version": np.asarray(FaceEncoder.MODEL_VERSION),
+            "user_ids": np.asarray(user_ids, dtype=np.int64),
+            "names": names,
+            "name_offsets": name_offsets,
+            "embeddings": np.asarray(rows, dtype=np.float32).reshape(
+                -1, EMBEDDING_SIZE
+            ),
+        }
+        arrays["checksum"] = np.asarray(self.checksum(arrays))
+
+        # np.savez appends .npz to paths without it, write to a file object
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        return len(user_ids)
+
+    def read(self, path):
+        """
+        Load and verify an archive.
+
+        Returns:
+        - user_ids: int64 array of the exported ids.
+        - user_names: List of names.
+        - embeddings: float32 array [N, 512].
+        """
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                arrays = {name: archive[name] for name in archive.files}
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            raise Exception(f"Failed to read gallery archive {path}: {e}")
+
+        checksum = str(arrays.pop("checksum", ""))
+        if checksum != self.checksum(arrays):
+            raise Exception("Gallery archive checksum mismatch, the file is corrupt")
+        if int(arrays["format_version"]) != self.FORMAT_VERSION:
+            raise Exception(
+                f"Unsupported gallery archive format {int(arrays['format_version'])}"
+            )
+        model_version = str(arrays["model_version"])
+        if model_version != FaceEncoder.MODEL_VERSION:
+            raise Exception(
+                f"Gallery archive was made with model {model_version}, "
+                f"this app uses {FaceEncoder.MODEL_VERSION}"
+            )
+
+        user_names = self.decode_names(arrays["names"], arrays["name_offsets"])
+        return arrays["user_ids"], user_names, arrays["embeddings"]
+
+    def restore(self, path):
+        """
+        Import an archive with one bulk insert.
+
+        Users whose name is already enrolled are skipped. The exported ids are
+        kept unless already taken, so kiosks provisioned from the same archive
+        share them; taken ids are replaced by new ones. Running galleries do
+        not see the new users until they reload the user list.
+
+        Parameters:
+        - path: Archive written by `export`.
+
+        Returns:
+        - inserted: Number of imported users.
+        - skipped: Number of users already enrolled.
+        """
+        user_ids, user_names, embeddings = self.read(path)
+
+        existing = self.repository.get_ids_and_names()
+        taken_ids = {row.id for row in existing}
+        taken_names = {row.user_name for row in existing}
+
+        # Every row gets an explicit id, taken ones are replaced by ids past
+        # every known id so they cannot collide with a later row
+        next_id = max([*taken_ids, *user_ids.tolist(), 0]) + 1
+        rows = []
+        for user_id, user_name, embedding in zip(
+            user_ids.tolist(), user_names, embeddings
+        ):
+            if user_name in taken_names:
+                continue
+            row = {
+                "user_name": user_name,
+                # Stored like a registration, a list with one [1, 512] tensor
+                "face_embedding": Users.encode_embedding(
+                    [torch.from_numpy(embedding.reshape(1, EMBEDDING_SIZE).copy())]
+                ),
+            }
+            if user_id in taken_ids:
+                user_id, next_id = next_id, next_id + 1
+            row["id"] = user_id
+            taken_ids.add(user_id)
+            taken_names.add(user_name)
+            rows.append(row)
+
+        try:
+            inserted = self.repository.add_users(rows)
+        except Exception as e:
+            raise Exception(f"Failed to import users: {e}")
+        return inserted, len(user_names) - inserted
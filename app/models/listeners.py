@@ -0,0 +1,38 @@
+class ListenerRegistry:
+    """
+    Change listeners for a repository, keyed by database path so every
+    repository instance sharing a database publishes to the same subscribers.
+
+    Each subclass gets its own registry. Subclasses need a `db` attribute and
+    define a `publish` method calling `notify_listeners`.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._listeners = {}
+
+    def subscribe(self, callback):
+        """
+        Register a callback called by `publish`, on the thread that made the
+        change, so GUI subscribers should forward it through a Qt signal.
+        """
+        listeners = self._listeners.setdefault(self.db.db_path, [])
+        if callback not in listeners:
+            listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        """Remove a callback previously registered with `subscribe`."""
+        listeners = self._listeners.get(self.db.db_path, [])
+        if callback in listeners:
+            listeners.remove(callback)
+
+    def has_listeners(self) -> bool:
+        return bool(self._listeners.get(self.db.db_path))
+
+    def notify_listeners(self, label: str, *args):
+        """Call every listener with `args`, logging the ones that fail."""
+        for callback in list(self._listeners.get(self.db.db_path, [])):
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"ERROR: {label} listener failed: {e}")
@@ -0,0 +1,239 @@
+import threading
+
+import numpy as np
+import torch
+
+from .gallery import (
+    EMBEDDING_SIZE,
+    embedding_to_array,
+    empty_top_k,
+    normalize_rows,
+    probe_matrix,
+    top_k_of_scores,
+)
+
+
+class GallerySnapshot:
+    def __init__(self, user_ids, user_names, embeddings, count, removed, version):
+        """
+        Immutable version of a LiveFaceGallery, matched like a FaceGallery.
+
+        The id and name lists and the embedding buffer are shared with newer
+        versions, which only append past `count` or tombstone rows, so the
+        first `count` entries never change under a reader.
+
+        Parameters:
+        - user_ids: Shared list of user ids, by row.
+        - user_names: Shared list of user names, by row.
+        - embeddings: Normalized float32 buffer, only [:count] is used.
+        - count: Number of rows of this version, removed rows included.
+        - removed: Tombstoned rows, which never match.
+        - version: Incremented by every change of the gallery.
+        """
+        self.user_ids = user_ids
+        self.user_names = user_names
+        self.embeddings = embeddings[:count]
+        self.count = count
+        self.removed = np.fromiter(removed, dtype=np.int64, count=len(removed))
+        self.version = version
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return self.embeddings.nbytes
+
+    def without(self, user_ids):
+        """Snapshot of the same rows in which the given users never match."""
+        ids = np.fromiter(self.user_ids[: self.count], dtype=np.int64, count=self.count)
+        excluded = np.flatnonzero(np.isin(ids, list(user_ids)))
+        return GallerySnapshot(
+            self.user_ids,
+            self.user_names,
+            self.embeddings,
+            self.count,
+            np.union1d(self.removed, excluded),
+            self.version,
+        )
+
+    def scores(self, embedding) -> np.ndarray:
+        """Cosine similarity against every row, -inf for removed rows."""
+        scores = self.embeddings @ normalize_rows(embedding_to_array(embedding))
+        scores[self.removed] = -np.inf
+        return scores
+
+    def match(self, embedding, threshold: float):
+        """
+        Find the enrolled users whose similarity exceeds the threshold.
+
+        Returns:
+        - matches: List of (index, similarity) tuples in gallery order.
+        """
+        if self.count == 0:
+            return []
+        scores = self.scores(embedding)
+        return [(int(i), float(scores[i])) for i in np.flatnonzero(scores > threshold)]
+
+    def best_match(self, embedding):
+        """Return (index, similarity) of the most similar user, or (None, 0.0)."""
+        if self.count - len(self.removed) == 0:
+            return None, 0.0
+        scores = self.scores(embedding)
+        index = int(np.argmax(scores))
+        return index, float(scores[index])
+
+    def top_k(self, probes, k: int):
+        """
+        Most similar users of each probe, see FaceGallery.top_k.
+        """
+        probes = probe_matrix(probes)
+        k = min(k, self.count - len(self.removed))
+        if k <= 0:
+            return empty_top_k(len(probes))
+        scores = probes @ self.embeddings.T
+        scores[:, self.removed] = -np.inf
+        return top_k_of_scores(scores, k)
+
+
+class LiveFaceGallery:
+    # Compact once this share of the rows are tombstones
+    MAX_REMOVED_RATIO = 0.25
+
+    def __init__(self, capacity=1024):
+        """
+        Gallery updated in place while readers keep matching.
+
+        Writers append to a preallocated buffer, doubling it when full, and
+        tombstone removed or replaced rows, then publish a new GallerySnapshot
+        by swapping one reference. Readers take `snapshot` once per frame and
+        never block or see a half-applied change; adding a user costs O(1)
+        amortized instead of decoding every user again.
+
+        Parameters:
+        - capacity: Initial number of rows of the embedding buffer.
+        """
+        self._lock = threading.Lock()
+        self._version = 0
+        self._reset(capacity)
+        self._publish()
+
+    def _reset(self, capacity):
+        """Start from an empty buffer; published snapshots keep the old one."""
+        self._embeddings = np.empty((max(1, capacity), EMBEDDING_SIZE), np.float32)
+        self._user_ids = []
+        self._user_names = []
+        self._rows = {}
+        self._removed = frozenset()
+
+    @classmethod
+    def from_users(cls, users):
+        """Decode the stored embedding of each user once and build a gallery."""
+        gallery = cls()
+        gallery.load(users)
+        return gallery
+
+    @staticmethod
+    def decode_user(user):
+        """Embedding row of a `Users` record, or None if it has none."""
+        decoded_embedding = user.decode_embedding()
+        if (
+            isinstance(decoded_embedding, list)
+            and len(decoded_embedding) > 0
+            and isinstance(decoded_embedding[0], torch.Tensor)
+        ):
+            return embedding_to_array(decoded_embedding)
+        return None
+
+    def _publish(self):
+        """Swap in a snapshot of the current rows, a single reference write."""
+        self.snapshot = GallerySnapshot(
+            self._user_ids,
+            self._user_names,
+            self._embeddings,
+            len(self._user_ids),
+            self._removed,
+            self._version,
+        )
+
+    def _append(self, user_id, user_name, row):
+        count = len(self._user_ids)
+        if count == len(self._embeddings):
+            # Older snapshots keep the old buffer, so copying is safe
+            grown = np.empty((2 * count, EMBEDDING_SIZE), dtype=np.float32)
+            grown[:count] = self._embeddings
+            self._embeddings = grown
+        self._embeddings[count] = normalize_rows(row)
+        self._user_ids.append(user_id)
+        self._user_names.append(user_name)
+        self._rows[user_id] = count
+
+    def _compact(self):
+        """Rebuild the rows without tombstones once there are too many."""
+        count = len(self._user_ids)
+        if len(self._removed) <= self.MAX_REMOVED_RATIO * count:
+            return
+        keep = [row for row in range(count) if row not in self._removed]
+        embeddings = np.empty(
+            (max(len(self._embeddings), 1), EMBEDDING_SIZE), dtype=np.float32
+        )
+        embeddings[: len(keep)] = self._embeddings[keep]
+        # New lists, older snapshots keep reading the previous ones
+        self._user_ids = [self._user_ids[row] for row in keep]
+        self._user_names = [self._user_names[row] for row in keep]
+        self._embeddings = embeddings
+        self._rows = {user_id: row for row, user_id in enumerate(self._user_ids)}
+        self._removed = frozenset()
+
+    def load(self, users):
+        """Replace the whole gallery with a list of `Users` records."""
+        with self._lock:
+            self._reset(max(1024, 2 * len(users)))
+            for user in users:
+                row = self.decode_user(user)
+                if row is not None:
+                    self._append(user.id, user.user_name, row)
+            self._version += 1
+            self._publish()
+
+    def add(self, user_id, user_name, embedding):
+        """
+        Enroll a user, replacing any previous embedding of the same id.
+
+        Parameters:
+        - user_id: Database id of the user.
+        - user_name: User name.
+        - embedding: Face embedding (tensor, array or stored list of tensors).
+        """
+        with self._lock:
+            previous = self._rows.get(user_id)
+            if previous is not None:
+                self._removed = self._removed | {previous}
+            self._append(user_id, user_name, embedding_to_array(embedding))
+            self._version += 1
+            self._compact()
+            self._publish()
+
+    def update(self, user_id, user_name, embedding):
+        """Replace the embedding of an enrolled user."""
+        self.add(user_id, user_name, embedding)
+
+    def remove(self, user_id):
+        """Unenroll a user; unknown ids are ignored."""
+        with self._lock:
+            row = self._rows.pop(user_id, None)
+            if row is None:
+                return
+            self._removed = self._removed | {row}
+            self._version += 1
+            self._compact()
+            self._publish()
+
+    def add_user(self, user):
+        """Enroll a `Users` record, e.g. from a repository event."""
+        row = self.decode_user(user)
+        if row is not None:
+            self.add(user.id, user.user_name, row)
+
+    def __len__(self):
+        return len(self._rows)
@@ -0,0 +1,213 @@
+import cv2
+
+from core import DETECTION_THRESHOLD, metrics
+
+
+def read_video_frames(source=0):
+    """
+    Frames of a camera or video file, read lazily.
+
+    Parameters:
+    - source: Camera index or video file path.
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise Exception(f"Could not open video source {source}")
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+
+def read_image_files(paths):
+    """Images of the given files, read lazily; unreadable files are skipped."""
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"WARNING: Could not read image {path}")
+            continue
+        yield image
+
+
+class DetectStage:
+    def __init__(self, detector, quality_gate=None):
+        """
+        Adds the detected `faces` of each frame.
+
+        Parameters:
+        - detector: Face detector with `detect_faces(image)`.
+        - quality_gate: Optional FaceQualityGate filtering the faces.
+        """
+        self.detector = detector
+        self.quality_gate = quality_gate
+
+    def __call__(self, records):
+        for record in records:
+            frame = record["frame"]
+            with metrics.timed("detect"):
+                faces = self.detector.detect_faces(frame)
+            metrics.increment("faces_detected", len(faces))
+            if self.quality_gate is not None:
+                with metrics.timed("quality"):
+                    faces = self.quality_gate.filter(frame, faces)
+            record["faces"] = faces
+            yield record
+
+
+class AlignStage:
+    def __init__(self, encoder):
+        """Adds the `aligned` 160x160 crop of each face."""
+        self.encoder = encoder
+
+    def __call__(self, records):
+        for record in records:
+            with metrics.timed("align"):
+                record["aligned"] = [
+                    self.encoder.align_face(record["frame"], face["keypoints"])
+                    for face in record["faces"]
+                ]
+            yield record
+
+
+class EncodeStage:
+    def __init__(self, encoder, batch_size=32):
+        """
+        Adds the `embeddings` of the aligned faces, one [1, 512] tensor each.
+
+        Frames are buffered until `batch_size` faces (or frames) are waiting,
+        then their faces are encoded in a single forward pass, so memory stays
+        bounded however long the input is.
+
+        Parameters:
+        - encoder: FaceEncoder.
+        - batch_size: Maximum number of faces per forward pass.
+        """
+        self.encoder = encoder
+        self.batch_size = batch_size
+
+    def flush(self, pending):
+        aligned = [crop for record in pending for crop in record["aligned"]]
+        if aligned:
+            with metrics.timed("encode"):
+                encodings = self.encoder.encode_batch(aligned)
+            metrics.increment("faces_encoded", len(aligned))
+        else:
+            encodings = []
+
+        offset = 0
+        for record in pending:
+            count = len(record["aligned"])
+            record["embeddings"] = encodings[offset : offset + count]
+            offset += count
+        return pending
+
+    def __call__(self, records):
+        pending, faces = [], 0
+        for record in records:
+            pending.append(record)
+            faces += len(record["aligned"])
+            if faces >= self.batch_size or len(pending) >= self.batch_size:
+                yield from self.flush(pending)
+                pending, faces = [], 0
+        if pending:
+            yield from self.flush(pending)
+
+
+class MatchStage:
+    def __init__(self, f_detector, threshold=DETECTION_THRESHOLD):
+        """
+        Adds the gallery `matches` of each embedding, see
+        FaceDetection.identify_faces; the gallery is set with `detect_user`.
+        """
+        self.f_detector = f_detector
+        self.threshold = threshold
+
+    def __call__(self, records):
+        for record in records:
+            record["matches"] = self.f_detector.identify_faces(
+                record["embeddings"], self.threshold
+            )
+            yield record
+
+
+class DrawStage:
+    def __init__(self, f_detector, copy=True):
+        """
+        Adds the `image` with the boxes, landmarks and matched names drawn.
+
+        Parameters:
+        - f_detector: FaceDetection providing the drawing and the gallery names.
+        - copy: Draw on a copy to keep the frame unchanged.
+        """
+        self.f_detector = f_detector
+        self.copy = copy
+
+    def __call__(self, records):
+        for record in records:
+            faces = record["faces"]
+            image = record["frame"].copy() if self.copy else record["frame"]
+            with metrics.timed("draw"):
+                if "matches" in record:
+                    image = self.f_detector.draw_matches(
+                        faces, record["matches"], image
+                    )
+                record["image"] = self.f_detector.draw_faces(faces, image, copy=False)
+            yield record
+
+
+class FacePipeline:
+    def __init__(self, stages):
+        """
+        Lazy pipeline over a stream of frames.
+
+        Each frame becomes a record dict (`index`, `frame`) that every stage
+        extends in turn, e.g. frames -> faces -> aligned crops -> embeddings ->
+        matches -> image. A stage is any callable taking and returning an
+        iterator of records, so stages can be left out or replaced.
+
+        Parameters:
+        - stages: Stages in the order they run.
+        """
+        self.stages = list(stages)
+
+    @classmethod
+    def from_face_detection(
+        cls, f_detector, encode=True, match=True, draw=False, batch_size=32
+    ):
+        """
+        Pipeline using the models of a FaceDetection.
+
+        Parameters:
+        - f_detector: FaceDetection with loaded models.
+        - encode: Align and encode the faces.
+        - match: Match the embeddings against the gallery (needs `encode`).
+        - draw: Draw the faces and names on a copy of each frame.
+        - batch_size: Maximum number of faces per forward pass.
+        """
+        stages = [DetectStage(f_detector.face_detector, f_detector.quality_gate)]
+        if encode:
+            stages.append(AlignStage(f_detector.encoder))
+            stages.append(EncodeStage(f_detector.encoder, batch_size))
+            if match:
+                stages.append(MatchStage(f_detector))
+        if draw:
+            stages.append(DrawStage(f_detector))
+        return cls(stages)
+
+    def run(self, frames):
+        """
+        Run the stages over an iterable of frames.
+
+        Returns:
+        - records: Generator of the completed records, in frame order.
+        """
+        records = (
+            {"index": index, "frame": frame} for index, frame in enumerate(frames)
+        )
+        for stage in self.stages:
+            records = stage(records)
+        return records
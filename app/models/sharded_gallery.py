@@ -0,0 +1,257 @@
+import weakref
+import multiprocessing as mp
+
+import numpy as np
+
+from core import GALLERY_SHARDS, GALLERY_SHORTLIST
+from core.runtime import usable_cores
+from core.shard_worker import shard_worker, start_worker
+from .gallery import (
+    EMBEDDING_SIZE,
+    FaceGallery,
+    GallerySubset,
+    embedding_to_array,
+    empty_top_k,
+    normalize_rows,
+    probe_matrix,
+)
+
+
+def _close_shards(processes, connections):
+    """Stop the shard workers, also called when the gallery is collected."""
+    for connection in connections:
+        try:
+            connection.send(("close", None))
+        except (OSError, ValueError):
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    for connection in connections:
+        connection.close()
+
+
+class ShardedFaceGallery:
+    def __init__(self, shards=GALLERY_SHARDS, shortlist=GALLERY_SHORTLIST):
+        """
+        Gallery partitioned across worker processes for very large enrolments.
+
+        Each worker holds a shard of the normalized embeddings and computes the
+        local top-k of a batch of probes; the candidates are merged here. The
+        shards score in parallel, so throughput grows with the cores while no
+        process holds the whole matrix.
+
+        Starting the workers costs a process spawn each, so they are started
+        on the first enrolment and the gallery is meant to be kept and
+        updated with `sync_users` or `add_users` rather than rebuilt.
+
+        Parameters:
+        - shards: Number of worker processes.
+        - shortlist: Number of candidates `match` considers per probe, like
+          CompressedFaceGallery.
+        """
+        self.shard_count = shards
+        self.shortlist = shortlist
+        self.user_ids = []
+        self.user_names = []
+        self.shard_sizes = [0] * shards
+        # Current row of each user, rows replaced by a newer embedding, and a
+        # fingerprint of the stored embedding of each synced user
+        self.rows = {}
+        self.stale = set()
+        self.fingerprints = {}
+
+        self.processes = []
+        self.connections = []
+        self._finalizer = None
+
+    def _start(self):
+        """Spawn the shard workers, once."""
+        if self._finalizer is not None:
+            return
+        context = mp.get_context("spawn")
+        threads = max(1, usable_cores() // self.shard_count)
+        for _ in range(self.shard_count):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=shard_worker, args=(child, threads), daemon=True
+            )
+            start_worker(process)
+            child.close()
+            self.processes.append(process)
+            self.connections.append(parent)
+        self._finalizer = weakref.finalize(
+            self, _close_shards, self.processes, self.connections
+        )
+
+    @classmethod
+    def from_gallery(cls, gallery: FaceGallery, shards=GALLERY_SHARDS):
+        """Partition the users of an exact gallery across shard workers."""
+        sharded = cls(shards)
+        sharded.add_users(gallery.user_ids, gallery.user_names, gallery.embeddings)
+        return sharded
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _receive(self, connection):
+        result = connection.recv()
+        if isinstance(result, Exception):
+            raise Exception(f"Gallery shard failed: {result}")
+        return result
+
+    def add_users(self, user_ids, user_names, embeddings):
+        """
+        Enroll users, keeping the shards balanced.
+
+        New rows go to the smallest shards first, so shard sizes never differ
+        by more than one row and the search time stays even across workers.
+
+        Parameters:
+        - user_ids: Database ids of the new users.
+        - user_names: User names, in the same order.
+        - embeddings: Array of shape [N, 512], one embedding per user.
+        """
+        rows = normalize_rows(
+            np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_SIZE)
+        )
+        if len(rows) == 0:
+            return
+        self._start()
+        start = len(self.user_ids)
+        self.user_ids.extend(user_ids)
+        self.user_names.extend(user_names)
+        for index, user_id in enumerate(user_ids, start):
+            # A user added again keeps only the new row
+            previous = self.rows.get(user_id)
+            if previous is not None:
+                self.stale.add(previous)
+            self.rows[user_id] = index
+
+        # Target size of each shard once the rows are added
+        total = start + len(rows)
+        targets = [
+            total // self.shard_count + (1 if i < total % self.shard_count else 0)
+            for i in range(self.shard_count)
+        ]
+        # Keep the largest shards where they are, top up the others
+        order = np.argsort(self.shard_sizes, kind="stable")[::-1]
+        offset = 0
+        pending = []
+        for shard, target in zip(order, sorted(targets, reverse=True)):
+            count = max(0, target - self.shard_sizes[shard])
+            count = min(count, len(rows) - offset)
+            if count == 0:
+                continue
+            indices = np.arange(start + offset, start + offset + count, dtype=np.int64)
+            self.connections[shard].send(
+                ("add", (indices, rows[offset : offset + count]))
+            )
+            pending.append(shard)
+            self.shard_sizes[shard] += count
+            offset += count
+
+        for shard in pending:
+            self._receive(self.connections[shard])
+
+    def sync_users(self, users):
+        """
+        Enroll the `Users` records that are new or whose stored embedding
+        changed since the last sync; unchanged users are not decoded again.
+        """
+        changed = [
+            user
+            for user in users
+            if self.fingerprints.get(user.id) != hash(user.face_embedding)
+        ]
+        if not changed:
+            return
+        gallery = FaceGallery.from_users(changed)
+        self.add_users(gallery.user_ids, gallery.user_names, gallery.embeddings)
+        for user in changed:
+            self.fingerprints[user.id] = hash(user.face_embedding)
+
+    def subset(self, users):
+        """
+        Sync the users and return a view that only matches them, e.g. the
+        users not present today, without another enrolment.
+        """
+        self.sync_users(users)
+        allowed = [self.rows[user.id] for user in users if user.id in self.rows]
+        excluded = np.ones(len(self.user_ids), dtype=bool)
+        excluded[allowed] = False
+        return GallerySubset(self, np.flatnonzero(excluded), len(allowed))
+
+    def top_k(self, probes, k: int, excluded=None):
+        """
+        Most similar users of each probe.
+
+        Parameters:
+        - probes: Embeddings, array-like of shape [Q, 512] (or one embedding).
+        - k: Number of candidates per probe.
+        - excluded: Gallery indices that never match, in addition to the rows
+          replaced by newer embeddings.
+
+        Returns:
+        - indices: Gallery indices, int array [Q, k], best first.
+        - scores: Cosine similarities, float32 array [Q, k].
+        """
+        probes = probe_matrix(probes)
+        if excluded is None:
+            excluded = np.fromiter(self.stale, dtype=np.int64, count=len(self.stale))
+            k = min(k, len(self))
+        else:
+            excluded = np.asarray(excluded, dtype=np.int64)
+            k = min(k, len(self.user_ids) - len(excluded))
+        if k <= 0:
+            return empty_top_k(len(probes))
+        # The workers take None when nothing is excluded, skipping the mask
+        excluded = excluded if len(excluded) > 0 else None
+
+        # Every shard searches before any result is read, so they run together
+        active = [
+            connection
+            for connection, size in zip(self.connections, self.shard_sizes)
+            if size > 0
+        ]
+        for connection in active:
+            connection.send(("search", (probes, k, excluded)))
+        results = [self._receive(connection) for connection in active]
+
+        indices = np.concatenate([result[0] for result in results], axis=1)
+        scores = np.concatenate([result[1] for result in results], axis=1)
+        best = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return (
+            np.take_along_axis(indices, best, axis=1),
+            np.take_along_axis(scores, best, axis=1),
+        )
+
+    def match(self, embedding, threshold: float, excluded=None):
+        """
+        Find the enrolled users whose similarity exceeds the threshold, among
+        the `shortlist` most similar ones.
+
+        Returns:
+        - matches: List of (index, similarity) tuples in gallery order.
+        """
+        indices, scores = self.top_k(
+            embedding_to_array(embedding), self.shortlist, excluded
+        )
+        return sorted(
+            (int(index), float(score))
+            for index, score in zip(indices[0], scores[0])
+            if score > threshold
+        )
+
+    def best_match(self, embedding, excluded=None):
+        """Return (index, similarity) of the most similar user, or (None, 0.0)."""
+        indices, scores = self.top_k(embedding_to_array(embedding), 1, excluded)
+        if indices.shape[1] == 0:
+            return None, 0.0
+        return int(indices[0, 0]), float(scores[0, 0])
+
+    def close(self):
+        """Stop the shard workers."""
+        if self._finalizer is not None:
+            self._finalizer()
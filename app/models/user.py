@@ -1,10 +1,11 @@
 import base64
 import pickle
-from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy import Column, Integer, String, create_engine, delete, insert, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 from core import AppContext
+from .listeners import ListenerRegistry
 
 Base = declarative_base()
 
@@ -21,14 +22,87 @@ class Users(Base):
     ):
         return pickle.loads(base64.b64decode(self.face_embedding.encode("utf-8")))
 
+    @staticmethod
+    def encode_embedding(embedding) -> str:
+        """Serialize a list of face embeddings for the `face_embedding` column."""
+        return base64.b64encode(pickle.dumps(embedding)).decode("utf-8")
 
-class UserRepository:
+
+class UserRepository(ListenerRegistry):
     def __init__(self, ctx: AppContext):
         self.ctx = ctx
         self.db = ctx.db
 
+    def publish(self, event: str, user: Users):
+        """
+        Call the listeners registered with `subscribe` with a user change: the
+        event ("added", "updated" or "removed") and the `Users` record.
+        """
+        self.notify_listeners("User", event, user)
+
     def add_user(self, user_name, face_embedding):
         self.db.create(Users(user_name=user_name, face_embedding=face_embedding))
+        if self.has_listeners():
+            user = self.get_by_name(user_name)
+            if user is not None:
+                self.publish("added", user)
+
+    def update_embedding(self, user_id, face_embedding):
+        """Replace the stored face embedding of a user."""
+        user = self.db.find(Users, id=user_id)
+        if user is None:
+            raise Exception(f"User {user_id} not found")
+        user.face_embedding = face_embedding
+        self.db.update(user)
+        self.publish("updated", user)
+
+    def delete_user(self, user_id):
+        """Delete a user and their attendance records."""
+        from .attendance import Attendance
+
+        user = self.db.find(Users, id=user_id)
+        if user is None:
+            return
+        session = self.db.get_session()
+        try:
+            session.execute(delete(Attendance).where(Attendance.user_id == user_id))
+            session.execute(delete(Users).where(Users.id == user_id))
+            session.commit()
+        finally:
+            session.close()
+        self.publish("removed", user)
+
+    def add_users(self, rows):
+        """
+        Insert many users in one transaction, without change events.
+
+        Parameters:
+        - rows: List of dicts with "user_name" and "face_embedding" (encoded
+          with `Users.encode_embedding`), and optionally "id".
+
+        Returns:
+        - count: Number of inserted users.
+        """
+        if not rows:
+            return 0
+        session = self.db.get_session()
+        try:
+            session.execute(insert(Users), rows)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return len(rows)
+
+    def get_ids_and_names(self):
+        """Ids and names of every user, without loading the embeddings."""
+        session = self.db.get_session()
+        try:
+            return session.execute(select(Users.id, Users.user_name)).all()
+        finally:
+            session.close()
 
     def get_by_name(self, user_name):
         return self.db.find(Users, user_name=user_name)
@@ -1,3 +1,13 @@
 from .test import FaceRecognitionTester
+from .embedding import BatchFaceEmbedder
+from .benchmark import PipelineBenchmark
+from .gallery_benchmark import GalleryCompressionBenchmark
+from .calibration import ThresholdCalibrator
 
-__all__ = ["FaceRecognitionTester"]
+__all__ = [
+    "FaceRecognitionTester",
+    "BatchFaceEmbedder",
+    "PipelineBenchmark",
+    "GalleryCompressionBenchmark",
+    "ThresholdCalibrator",
+]
@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+import cv2
+import numpy as np
+import torch
+
+from core import AppContext, FACE_DETECTOR_BACKEND
+from core.runtime import runtime_report, usable_cores
+from cv_models import FaceEncoder, create_face_detector
+from migration import run_migration_table
+from models import UserRepository, AttendanceRepository
+from models.gallery import EMBEDDING_SIZE, FaceGallery, CompressedFaceGallery
+from models.sharded_gallery import ShardedFaceGallery
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+REPORT_DIR = os.path.join(ROOT_DIR, "test_reports")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def timing_stats(samples):
+    """Summarize durations in seconds as milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "count": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "min_ms": float(ms.min()),
+        "max_ms": float(ms.max()),
+    }
+
+
+def environment_info():
+    """Describe the machine and commit a benchmark ran on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "face_detector_backend": FACE_DETECTOR_BACKEND,
+        "runtime": runtime_report(),
+    }
+
+
+def write_report(prefix, report):
+    """Save a report as JSON under test_reports and return its path."""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_path = os.path.join(REPORT_DIR, f"{prefix}_{timestamp}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"INFO: Report saved to {report_path}")
+    return report_path
+
+
+def augmentations(image):
+    """Synthetic variations of a test image, keyed by name."""
+    h, w = image.shape[:2]
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), 10, 1.0)
+    return {
+        "original": image,
+        "flipped": cv2.flip(image, 1),
+        "bright": cv2.convertScaleAbs(image, alpha=1.0, beta=40),
+        "dark": cv2.convertScaleAbs(image, alpha=0.6, beta=0),
+        "blurred": cv2.GaussianBlur(image, (0, 0), 2),
+        "half_size": cv2.resize(image, (w // 2, h // 2), interpolation=cv2.INTER_AREA),
+        "double_size": cv2.resize(image, (w * 2, h * 2)),
+        "rotated": cv2.warpAffine(image, rotation, (w, h)),
+    }
+
+
+class PipelineBenchmark:
+    def __init__(
+        self,
+        repeats=3,
+        gallery_sizes=(1000, 10000, 100000),
+        gallery_probes=200,
+        attendance_users=500,
+        seed=0,
+    ):
+        """
+        Times every stage of the pipeline without a camera.
+
+        Parameters:
+        - repeats: Number of times each image is run through the models.
+        - gallery_sizes: Synthetic gallery sizes for the matching benchmark.
+        - gallery_probes: Number of probes matched against each gallery.
+        - attendance_users: Users created and marked in the attendance benchmark.
+        - seed: Random seed of the synthetic data.
+        """
+        self.repeats = repeats
+        self.gallery_sizes = gallery_sizes
+        self.gallery_probes = gallery_probes
+        self.attendance_users = attendance_users
+        self.rng = np.random.default_rng(seed)
+
+    def load_images(self):
+        """Read the test images and their augmentations."""
+        images = {}
+        test_dir = os.path.join(ROOT_DIR, "test_images")
+        for folder in ("registration", "test"):
+            folder_path = os.path.join(test_dir, folder)
+            for file in sorted(os.listdir(folder_path)):
+                if not file.endswith(IMAGE_EXTENSIONS):
+                    continue
+                image = cv2.imread(os.path.join(folder_path, file))
+                if image is None:
+                    continue
+                for name, variant in augmentations(image).items():
+                    images[f"{folder}/{file}:{name}"] = variant
+        return images
+
+    def bench_models(self, images):
+        """Time detection, alignment, encoding and the full face pipeline."""
+        start_time = time.perf_counter()
+        detector = create_face_detector()
+        encoder = FaceEncoder()
+        load_time = time.perf_counter() - start_time
+
+        timings = {
+            "detect_faces": [],
+            "align_face": [],
+            "encode_face": [],
+            "process_faces": [],
+        }
+        detected = {}
+
+        for _ in range(self.repeats):
+            for key, image in images.items():
+                start_time = time.perf_counter()
+                faces = detector.detect_faces(image)
+                timings["detect_faces"].append(time.perf_counter() - start_time)
+                detected[key] = len(faces)
+
+                if not faces:
+                    continue
+
+                with torch.no_grad():
+                    for face in faces:
+                        start_time = time.perf_counter()
+                        aligned = encoder.align_face(image, face["keypoints"])
+                        timings["align_face"].append(time.perf_counter() - start_time)
+
+                        start_time = time.perf_counter()
+                        encoder.encode_face(aligned)
+                        timings["encode_face"].append(time.perf_counter() - start_time)
+
+                    start_time = time.perf_counter()
+                    encoder.process_faces(image, faces)
+                    timings["process_faces"].append(time.perf_counter() - start_time)
+
+        results = {stage: timing_stats(samples) for stage, samples in timings.items()}
+        results["model_load_s"] = load_time
+        results["faces_per_image"] = detected
+        return results
+
+    def bench_gallery(self):
+        """
+        Time exact and compressed matching against synthetic galleries.
+
+        The compressed galleries memory-map their exact matrix, as
+        `build_gallery` does, so `gallery_bytes` compares the resident sizes.
+        """
+        results = {}
+        probes = self.rng.standard_normal(
+            (self.gallery_probes, EMBEDDING_SIZE), dtype=np.float32
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for size in self.gallery_sizes:
+                embeddings = self.rng.standard_normal(
+                    (size, EMBEDDING_SIZE), dtype=np.float32
+                )
+                names = [f"synthetic_{i}" for i in range(size)]
+                galleries = {"exact": FaceGallery(range(size), names, embeddings)}
+                galleries["compressed"] = CompressedFaceGallery.from_gallery(
+                    galleries["exact"],
+                    exact_path=os.path.join(tmp_dir, f"exact_{size}.npy"),
+                )
+
+                for kind, gallery in galleries.items():
+                    samples = []
+                    for probe in probes:
+                        start_time = time.perf_counter()
+                        gallery.best_match(probe)
+                        samples.append(time.perf_counter() - start_time)
+                    stats = timing_stats(samples)
+                    stats["gallery_bytes"] = gallery.nbytes
+                    results[f"{kind}_{size}"] = stats
+                # Drop the memory maps before the directory is removed
+                del galleries
+
+        return results
+
+    def bench_sharding(self, k=5, rounds=5):
+        """
+        Throughput of batched top-k search on the largest synthetic gallery,
+        in-process and sharded across 1, 2, 4, ... worker processes.
+        """
+        size = max(self.gallery_sizes)
+        embeddings = self.rng.standard_normal((size, EMBEDDING_SIZE), dtype=np.float32)
+        probes = self.rng.standard_normal(
+            (self.gallery_probes, EMBEDDING_SIZE), dtype=np.float32
+        )
+        exact = FaceGallery(range(size), [""] * size, embeddings)
+
+        def throughput(search):
+            search()  # Warm up
+            start_time = time.perf_counter()
+            for _ in range(rounds):
+                search()
+            return rounds * len(probes) / (time.perf_counter() - start_time)
+
+        def exact_top_k():
+            scores = probes @ exact.embeddings.T
+            return np.argpartition(scores, -k, axis=1)[:, -k:]
+
+        results = {"gallery_size": size, "in_process": throughput(exact_top_k)}
+        shards = 1
+        while shards <= usable_cores():
+            gallery = ShardedFaceGallery.from_gallery(exact, shards=shards)
+            try:
+                probes_per_second = throughput(lambda: gallery.top_k(probes, k))
+            finally:
+                gallery.close()
+            results[f"shards_{shards}"] = probes_per_second
+            print(f"{shards} shards: {probes_per_second:.0f} probes/s")
+            shards *= 2
+        return results
+
+    def bench_attendance(self):
+        """Time user inserts and attendance writes on a throwaway database."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ctx = AppContext(os.path.join(tmp_dir, "benchmark.db"))
+            run_migration_table(ctx.db.engine)
+            users = UserRepository(ctx)
+            attendance = AttendanceRepository(ctx)
+
+            add_user, mark_attendance, repeat_mark = [], [], []
+            for i in range(self.attendance_users):
+                start_time = time.perf_counter()
+                users.add_user(f"benchmark_{i}", "")
+                add_user.append(time.perf_counter() - start_time)
+
+            user_ids = [user.id for user in users.get_all()]
+            for samples in (mark_attendance, repeat_mark):
+                for user_id in user_ids:
+                    start_time = time.perf_counter()
+                    attendance.mark_attendance(user_id, True)
+                    samples.append(time.perf_counter() - start_time)
+
+            ctx.db.close_connection()
+            ctx.db.engine.dispose()
+
+        return {
+            "add_user": timing_stats(add_user),
+            "mark_attendance": timing_stats(mark_attendance),
+            "mark_attendance_already_marked": timing_stats(repeat_mark),
+        }
+
+    def run(self, stages=("models", "gallery", "attendance")):
+        """Run the selected stages, print a summary and save a JSON report."""
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "environment": environment_info(),
+            "parameters": {
+                "repeats": self.repeats,
+                "gallery_sizes": list(self.gallery_sizes),
+                "gallery_probes": self.gallery_probes,
+                "attendance_users": self.attendance_users,
+            },
+            "results": {},
+        }
+
+        if "models" in stages:
+            print("\n=== Benchmarking detection and encoding ===")
+            images = self.load_images()
+            report["parameters"]["images"] = len(images)
+            report["results"]["models"] = self.bench_models(images)
+
+        if "gallery" in stages:
+            print("\n=== Benchmarking gallery matching ===")
+            report["results"]["gallery"] = self.bench_gallery()
+
+        if "sharding" in stages:
+            print("\n=== Benchmarking sharded gallery search ===")
+            report["results"]["sharding"] = self.bench_sharding()
+
+        if "attendance" in stages:
+            print("\n=== Benchmarking attendance writes ===")
+            report["results"]["attendance"] = self.bench_attendance()
+
+        for group, results in report["results"].items():
+            for name, stats in results.items():
+                if isinstance(stats, dict) and "p50_ms" in stats:
+                    print(
+                        f"{group}.{name}: p50 {stats['p50_ms']:.2f}ms "
+                        f"p95 {stats['p95_ms']:.2f}ms (n={stats['count']})"
+                    )
+
+        write_report("benchmark", report)
+        return report
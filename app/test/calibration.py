@@ -0,0 +1,283 @@
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from core import DETECTION_THRESHOLD, CALIBRATION_CACHE_PATH, CALIBRATION_TARGET_FAR
+from models.gallery import EMBEDDING_SIZE, normalize_rows
+
+from .benchmark import ROOT_DIR, REPORT_DIR, write_report
+from .embedding import IMAGE_EXTENSIONS, BatchFaceEmbedder, label_from_filename
+
+
+class ThresholdCalibrator:
+    # Similarity histogram resolution over [-1, 1]
+    BINS = 2000
+    # Rows of the similarity matrix computed at once
+    BLOCK_SIZE = 1024
+
+    def __init__(
+        self,
+        folder=None,
+        cache_path=CALIBRATION_CACHE_PATH,
+        target_far=CALIBRATION_TARGET_FAR,
+    ):
+        """
+        Calibrates the detection threshold on a labelled image folder.
+
+        Every image is embedded once, all pairs are scored, and the false
+        accept / false reject rates are swept over the thresholds. Images are
+        labelled by file name prefix, e.g. `prabhu_1.jpeg` -> `prabhu`.
+
+        Parameters:
+        - folder: Labelled folder, searched recursively. Defaults to test_images.
+        - cache_path: .npz file caching the embeddings between runs.
+        - target_far: Highest false accept rate allowed at the recommended
+          threshold.
+        """
+        self.folder = folder or os.path.join(ROOT_DIR, "test_images")
+        self.cache_path = cache_path
+        self.target_far = target_far
+        self.embedder = None
+
+    def list_images(self):
+        paths = []
+        for root, _, files in os.walk(self.folder):
+            paths.extend(
+                os.path.join(root, file)
+                for file in files
+                if file.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        return sorted(os.path.abspath(path) for path in paths)
+
+    @staticmethod
+    def cache_key(path: str) -> str:
+        """Path, size and modification time, so edited images are re-embedded."""
+        stat = os.stat(path)
+        return f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def load_cache(self):
+        """Cached embeddings by key, and the keys of images without a face."""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}, set()
+        with np.load(self.cache_path) as cache:
+            embedded = dict(zip(cache["keys"].tolist(), cache["embeddings"]))
+            missing = set(cache["missing"].tolist())
+        return embedded, missing
+
+    def save_cache(self, embedded, missing):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        keys = list(embedded)
+        embeddings = (
+            np.stack([embedded[key] for key in keys])
+            if keys
+            else np.empty((0, EMBEDDING_SIZE), dtype=np.float32)
+        )
+        with open(self.cache_path, "wb") as f:
+            np.savez(
+                f,
+                keys=np.array(keys, dtype=str),
+                embeddings=embeddings,
+                missing=np.array(sorted(missing), dtype=str),
+            )
+
+    def embed(self, paths):
+        """
+        Embeddings of the images, embedding only those not in the cache.
+
+        Returns:
+        - labels: Label of each embedded image.
+        - embeddings: Normalized float32 array of shape [N, 512].
+        - stats: Number of cached, newly embedded and faceless images.
+        """
+        embedded, missing = self.load_cache()
+        keys = {path: self.cache_key(path) for path in paths}
+        pending = [
+            path
+            for path in paths
+            if keys[path] not in embedded and keys[path] not in missing
+        ]
+
+        if pending:
+            if self.embedder is None:
+                self.embedder = BatchFaceEmbedder()
+            print(f"INFO: Embedding {len(pending)} new images")
+            result = self.embedder.embed(pending)
+            for path, embedding in zip(result["paths"], result["embeddings"]):
+                embedded[keys[path]] = embedding
+            missing.update(keys[path] for path in result["missing"])
+
+        # Forget images that were deleted or changed
+        current = set(keys.values())
+        embedded = {key: value for key, value in embedded.items() if key in current}
+        missing &= current
+        self.save_cache(embedded, missing)
+
+        kept = [path for path in paths if keys[path] in embedded]
+        rows = [embedded[keys[path]] for path in kept]
+        embeddings = (
+            normalize_rows(np.stack(rows).astype(np.float32))
+            if rows
+            else np.empty((0, EMBEDDING_SIZE), dtype=np.float32)
+        )
+        stats = {
+            "cached": len(paths) - len(pending),
+            "embedded": len(pending),
+            "no_face": len(paths) - len(kept),
+        }
+        return [label_from_filename(path) for path in kept], embeddings, stats
+
+    def pair_histograms(self, labels, embeddings):
+        """
+        Histograms of the genuine (same label) and impostor pair similarities.
+
+        The similarity matrix is computed in blocks of rows and only the upper
+        triangle is counted, so memory stays bounded for thousands of images.
+        """
+        _, codes = np.unique(labels, return_inverse=True)
+        count = len(codes)
+        genuine = np.zeros(self.BINS, dtype=np.int64)
+        impostor = np.zeros(self.BINS, dtype=np.int64)
+        columns = np.arange(count)
+
+        for start in range(0, count, self.BLOCK_SIZE):
+            rows = columns[start : start + self.BLOCK_SIZE]
+            scores = embeddings[rows] @ embeddings.T
+            bins = ((scores + 1.0) * (self.BINS / 2)).astype(np.int64)
+            np.clip(bins, 0, self.BINS - 1, out=bins)
+
+            upper = columns[None, :] > rows[:, None]
+            same = codes[rows][:, None] == codes[None, :]
+            genuine += np.bincount(bins[upper & same], minlength=self.BINS)
+            impostor += np.bincount(bins[upper & ~same], minlength=self.BINS)
+
+        return genuine, impostor
+
+    def sweep(self, genuine, impostor):
+        """
+        False accept and false reject rates at every histogram threshold.
+
+        A pair is accepted when its similarity exceeds the threshold, like
+        FaceDetection does.
+
+        Returns:
+        - thresholds, far, frr: Arrays of the same length.
+        """
+        thresholds = np.linspace(-1.0, 1.0, self.BINS + 1)[:-1]
+        accepted_impostors = np.cumsum(impostor[::-1])[::-1]
+        accepted_genuine = np.cumsum(genuine[::-1])[::-1]
+        far = accepted_impostors / max(impostor.sum(), 1)
+        frr = 1.0 - accepted_genuine / max(genuine.sum(), 1)
+        return thresholds, far, frr
+
+    def plot(self, thresholds, far, frr, path):
+        """Save the FAR/FRR and ROC curves as an image, without opening a window."""
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(12, 5))
+        ax_rates, ax_roc = fig.subplots(1, 2)
+        ax_rates.plot(thresholds, far, label="FAR")
+        ax_rates.plot(thresholds, frr, label="FRR")
+        ax_rates.axvline(DETECTION_THRESHOLD, color="gray", linestyle="--")
+        ax_rates.set(xlabel="Threshold", ylabel="Rate", title="FAR / FRR")
+        ax_rates.legend()
+        ax_roc.plot(far, 1.0 - frr)
+        ax_roc.set(
+            xscale="log",
+            xlabel="False accept rate",
+            ylabel="True accept rate",
+            title="ROC",
+        )
+        fig.tight_layout()
+        fig.savefig(path)
+        print(f"INFO: Curves saved to {path}")
+
+    def run(self, save_plot=True):
+        """Calibrate, print the operating points and save a JSON report."""
+        print("\n=== Threshold Calibration ===")
+        paths = self.list_images()
+        start_time = time.perf_counter()
+        labels, embeddings, stats = self.embed(paths)
+        embed_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        genuine, impostor = self.pair_histograms(labels, embeddings)
+        thresholds, far, frr = self.sweep(genuine, impostor)
+        score_time = time.perf_counter() - start_time
+
+        def operating_point(index):
+            return {
+                "threshold": float(thresholds[index]),
+                "far": float(far[index]),
+                "frr": float(frr[index]),
+            }
+
+        # Without both kinds of pairs one rate is 0 everywhere and any
+        # "operating point" is meaningless, e.g. FAR 0 at threshold -1
+        calibrated = genuine.sum() > 0 and impostor.sum() > 0
+        eer = recommended = None
+        if calibrated:
+            eer_index = int(np.argmin(np.abs(far - frr)))
+            eer = operating_point(eer_index)
+            eer["eer"] = float((far[eer_index] + frr[eer_index]) / 2)
+
+            # Lowest threshold (fewest rejections) meeting the false accept target
+            allowed = np.flatnonzero(far <= self.target_far)
+            recommended = operating_point(int(allowed[0])) if len(allowed) else None
+
+        current_index = int(np.searchsorted(thresholds, DETECTION_THRESHOLD))
+        current_index = min(current_index, len(thresholds) - 1)
+
+        # Curves at a 0.01 step keep the report readable
+        step = self.BINS // 200
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "folder": self.folder,
+            "images": len(paths),
+            "identities": len(set(labels)),
+            "genuine_pairs": int(genuine.sum()),
+            "impostor_pairs": int(impostor.sum()),
+            "embedding": stats,
+            "embed_seconds": embed_time,
+            "score_seconds": score_time,
+            "target_far": self.target_far,
+            "current": operating_point(current_index),
+            "equal_error_rate": eer,
+            "recommended": recommended,
+            "curves": {
+                "thresholds": thresholds[::step].round(4).tolist(),
+                "far": far[::step].tolist(),
+                "frr": frr[::step].tolist(),
+            },
+        }
+
+        print(f"Images: {len(paths)} ({stats['embedded']} newly embedded)")
+        print(f"Genuine pairs: {report['genuine_pairs']}")
+        print(f"Impostor pairs: {report['impostor_pairs']}")
+        print(f"Current threshold: {report['current']}")
+        print(f"Equal error rate: {eer}")
+        if not calibrated:
+            print(
+                "WARNING: Calibration needs at least two images of one user and "
+                "two different users, no threshold recommended"
+            )
+        elif recommended is None:
+            print(f"WARNING: No threshold reaches a FAR of {self.target_far}")
+        else:
+            print(f"Recommended threshold: {recommended}")
+
+        if save_plot:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            self.plot(
+                thresholds,
+                far,
+                frr,
+                os.path.join(REPORT_DIR, f"calibration_{timestamp}.png"),
+            )
+
+        write_report("calibration", report)
+        return report
@@ -0,0 +1,160 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from models import FaceDetection
+from models.gallery import EMBEDDING_SIZE, embedding_to_array
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def label_from_filename(file: str) -> str:
+    """User name of a test image, e.g. `prabhu_1.jpeg` -> `prabhu`."""
+    return os.path.splitext(os.path.basename(file))[0].split("_")[0]
+
+
+def list_images(folder: str):
+    """Sorted paths of the images in a folder."""
+    return [
+        os.path.join(folder, file)
+        for file in sorted(os.listdir(folder))
+        if file.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+class BatchFaceEmbedder:
+    def __init__(self, f_detector=None, batch_size=32, workers=4):
+        """
+        Embeds the first face of many images with models loaded once.
+
+        Images are read, decoded and hashed in parallel by a thread pool while
+        the previous ones are detected, and the aligned faces of a chunk are
+        encoded in a single forward pass.
+
+        Parameters:
+        - f_detector: FaceDetection to reuse, one is created when omitted.
+        - batch_size: Number of images per chunk (and faces per forward pass).
+        - workers: Number of threads decoding images.
+        """
+        self.f_detector = f_detector if f_detector is not None else FaceDetection()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.fingerprint = None
+
+    def read_image(self, path):
+        """File content, decoded image, cache key and read time of an image."""
+        start_time = time.perf_counter()
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None, None, time.perf_counter() - start_time
+
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        key = None
+        if self.f_detector.cache is not None:
+            key = self.f_detector.cache.key(content, self.fingerprint)
+        return image, key, time.perf_counter() - start_time
+
+    def detect_faces(self, image):
+        """Faces that pass the quality gate."""
+        faces = self.f_detector.face_detector.detect_faces(image)
+        if self.f_detector.quality_gate is not None:
+            faces = self.f_detector.quality_gate.filter(image, faces)
+        return faces
+
+    def embed(self, paths):
+        """
+        Embed the first face of each image.
+
+        Images already in the face cache are not run through the models. Every
+        usable face of the other images is encoded, so their cache entries are
+        complete.
+
+        Parameters:
+        - paths: Image paths.
+
+        Returns:
+        - result: Dict with the `paths` that produced an embedding, their
+          `embeddings` as a float32 [N, 512] array, the `missing` paths (unreadable
+          or without a usable face) and per-stage `timings` in seconds.
+        """
+        kept, rows, missing = [], [], []
+        timings = {"read": [], "detect": [], "align": [], "encode": []}
+        cache = self.f_detector.cache
+        self.fingerprint = self.f_detector.cache_fingerprint()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for start in range(0, len(paths), self.batch_size):
+                chunk = paths[start : start + self.batch_size]
+                # First embedding of each image, filled from the cache or the batch
+                firsts = {}
+                pending, aligned_faces = [], []
+
+                for path, (image, key, read_time) in zip(
+                    chunk, executor.map(self.read_image, chunk)
+                ):
+                    timings["read"].append(read_time)
+                    if image is None:
+                        # Reported as missing below
+                        continue
+
+                    entry = cache.get(key) if cache is not None else None
+                    if entry is not None:
+                        if len(entry[1]) > 0:
+                            firsts[path] = entry[1][0]
+                        continue
+
+                    start_time = time.perf_counter()
+                    faces = self.detect_faces(image)
+                    timings["detect"].append(time.perf_counter() - start_time)
+
+                    start_time = time.perf_counter()
+                    for face in faces:
+                        aligned_faces.append(
+                            self.f_detector.encoder.align_face(image, face["keypoints"])
+                        )
+                    if faces:
+                        timings["align"].append(time.perf_counter() - start_time)
+                    pending.append((path, key, faces))
+
+                if aligned_faces:
+                    start_time = time.perf_counter()
+                    encodings = self.f_detector.encoder.encode_batch(aligned_faces)
+                    per_face = (time.perf_counter() - start_time) / len(aligned_faces)
+                    timings["encode"].extend([per_face] * len(aligned_faces))
+                else:
+                    encodings = []
+
+                offset = 0
+                for path, key, faces in pending:
+                    image_rows = [
+                        embedding_to_array(encoding)
+                        for encoding in encodings[offset : offset + len(faces)]
+                    ]
+                    offset += len(faces)
+                    if cache is not None:
+                        cache.put(key, faces, image_rows)
+                    if image_rows:
+                        firsts[path] = image_rows[0]
+
+                for path in chunk:
+                    if path in firsts:
+                        kept.append(path)
+                        rows.append(firsts[path])
+                    else:
+                        print(f"WARNING: No usable face in {path}")
+                        missing.append(path)
+
+        embeddings = (
+            np.stack(rows) if rows else np.empty((0, EMBEDDING_SIZE), dtype=np.float32)
+        )
+        return {
+            "paths": kept,
+            "embeddings": embeddings,
+            "missing": missing,
+            "timings": timings,
+        }
@@ -0,0 +1,168 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from core import DETECTION_THRESHOLD, GALLERY_PCA_COMPONENTS, GALLERY_SHORTLIST
+from models import FaceDetection
+from models.gallery import (
+    EMBEDDING_SIZE,
+    FaceGallery,
+    CompressedFaceGallery,
+    embedding_to_array,
+    normalize_rows,
+)
+from .benchmark import write_report
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class GalleryCompressionBenchmark:
+    def __init__(
+        self,
+        synthetic_identities=10000,
+        synthetic_probes=1000,
+        n_components=GALLERY_PCA_COMPONENTS,
+        shortlist=GALLERY_SHORTLIST,
+        seed=0,
+    ):
+        """
+        Compare the exact gallery with the compressed (PCA + int8) gallery.
+
+        The real identities from `test_images` are padded with synthetic ones
+        drawn from a low-rank model, since face embeddings concentrate their
+        variance in few directions much like the real ones.
+
+        Parameters:
+        - synthetic_identities: Number of synthetic users added to the gallery.
+        - synthetic_probes: Number of noisy probes drawn from synthetic users.
+        - n_components: PCA dimension of the compressed gallery.
+        - shortlist: Candidates re-scored exactly by the compressed gallery.
+        - seed: Random seed of the synthetic data.
+        """
+        self.synthetic_identities = synthetic_identities
+        self.synthetic_probes = synthetic_probes
+        self.n_components = n_components
+        self.shortlist = shortlist
+        self.rng = np.random.default_rng(seed)
+        self.f_detector = None
+
+    def embed_folder(self, folder):
+        """Embed the first face of each image, labelled by file name prefix."""
+        if self.f_detector is None:
+            self.f_detector = FaceDetection()
+
+        labels, rows = [], []
+        for file in sorted(os.listdir(folder)):
+            if not file.endswith(IMAGE_EXTENSIONS):
+                continue
+            frame = cv2.imread(os.path.join(folder, file))
+            if frame is None:
+                continue
+            _, encoded_faces = self.f_detector.detect_faces(frame)
+            if len(encoded_faces) == 0:
+                print(f"WARNING: No face detected in {file}")
+                continue
+            labels.append(os.path.splitext(file)[0].split("_")[0])
+            rows.append(embedding_to_array(encoded_faces[0]))
+
+        return labels, rows
+
+    def synthetic_embeddings(self, count, rank=64, noise=0.05):
+        """Draw unit vectors from a random low-rank subspace plus noise."""
+        basis = self.rng.standard_normal((rank, EMBEDDING_SIZE)).astype(np.float32)
+        latent = self.rng.standard_normal((count, rank)).astype(np.float32)
+        samples = latent @ basis / np.sqrt(rank)
+        samples += noise * self.rng.standard_normal(samples.shape).astype(np.float32)
+        return normalize_rows(samples)
+
+    def perturb(self, embeddings, similarity=0.8):
+        """Noisy copies of unit vectors with the given expected similarity."""
+        noise = normalize_rows(
+            self.rng.standard_normal(embeddings.shape).astype(np.float32)
+        )
+        spread = np.sqrt(1.0 - similarity**2)
+        return normalize_rows(similarity * embeddings + spread * noise)
+
+    @staticmethod
+    def predict(gallery, probes):
+        """Top-1 label per probe, 'Unknown' below the detection threshold."""
+        predictions, elapsed = [], []
+        for probe in probes:
+            start_time = time.perf_counter()
+            index, score = gallery.best_match(probe)
+            elapsed.append(time.perf_counter() - start_time)
+            if index is None or score <= DETECTION_THRESHOLD:
+                predictions.append("Unknown")
+            else:
+                predictions.append(gallery.user_names[index])
+        return predictions, float(np.mean(elapsed)) if elapsed else 0.0
+
+    def run(self):
+        """Run the benchmark, print a summary and save a JSON report."""
+        test_dir = os.path.join(ROOT_DIR, "test_images")
+        reg_labels, reg_rows = self.embed_folder(os.path.join(test_dir, "registration"))
+        probe_labels, probe_rows = self.embed_folder(os.path.join(test_dir, "test"))
+
+        synthetic = self.synthetic_embeddings(self.synthetic_identities)
+        synthetic_names = [f"synthetic_{i}" for i in range(len(synthetic))]
+        embeddings = np.vstack(
+            [np.asarray(reg_rows, dtype=np.float32).reshape(-1, EMBEDDING_SIZE)]
+            + [synthetic]
+        )
+        names = reg_labels + synthetic_names
+        exact = FaceGallery(range(len(names)), names, embeddings)
+
+        start_time = time.perf_counter()
+        compressed = CompressedFaceGallery.from_gallery(
+            exact, n_components=self.n_components, shortlist=self.shortlist
+        )
+        fit_time = time.perf_counter() - start_time
+
+        # Real probes plus noisy copies of synthetic identities
+        picked = self.rng.choice(
+            len(synthetic),
+            size=min(self.synthetic_probes, len(synthetic)),
+            replace=False,
+        )
+        probes = list(probe_rows) + list(self.perturb(synthetic[picked]))
+        truth = probe_labels + [synthetic_names[i] for i in picked]
+        real = len(probe_rows)
+
+        exact_pred, exact_time = self.predict(exact, probes)
+        compressed_pred, compressed_time = self.predict(compressed, probes)
+
+        def accuracy(predictions, start=0, end=None):
+            pairs = list(zip(truth, predictions))[start:end]
+            return sum(t == p for t, p in pairs) / len(pairs) if pairs else None
+
+        # The exact matrix is memory-mapped when the compressed gallery is live
+        compressed_resident = compressed.compressed_nbytes
+        report = {
+            "identities": len(exact),
+            "probes": len(probes),
+            "real_probes": real,
+            "n_components": compressed.components.shape[0],
+            "shortlist": self.shortlist,
+            "exact_bytes": exact.nbytes,
+            "compressed_bytes": compressed_resident,
+            "memory_saved": 1.0 - compressed_resident / exact.nbytes,
+            "fit_time": fit_time,
+            "exact_match_time": exact_time,
+            "compressed_match_time": compressed_time,
+            "exact_accuracy": accuracy(exact_pred),
+            "compressed_accuracy": accuracy(compressed_pred),
+            "accuracy_delta": accuracy(compressed_pred) - accuracy(exact_pred),
+            "real_exact_accuracy": accuracy(exact_pred, end=real),
+            "real_compressed_accuracy": accuracy(compressed_pred, end=real),
+            "top1_agreement": float(np.mean(np.equal(exact_pred, compressed_pred))),
+        }
+
+        print("\n=== Gallery Compression Benchmark ===")
+        for key, value in report.items():
+            print(f"{key}: {value}")
+
+        write_report("gallery_benchmark", report)
+        return report
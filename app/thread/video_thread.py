@@ -1,14 +1,29 @@
 from PyQt5.QtCore import QThread, pyqtSignal
+import time
 import cv2
 import torch
 
-from core import AppContext
-from models import FaceDetection, UserRepository
+from core import (
+    AppContext,
+    MOTION_GATE_ENABLED,
+    IDLE_AFTER_SECONDS,
+    ACTIVE_FRAME_INTERVAL_MS,
+    IDLE_FRAME_INTERVAL_MS,
+    DETECTION_WORKERS,
+    ROI_DETECTION_ENABLED,
+    metrics,
+    pin_thread,
+)
+from cv_models import MotionDetector, ROIFaceDetector
+from models import FaceDetection, LiveFaceGallery, UserRepository
+from models.detection_pool import DetectionPool
 
 
 # Run video capture in a separate thread
 class VideoCaptureThread(QThread):
     frame_ready = pyqtSignal(object)
+    # BGR frame already scaled to the display size, see set_display_size
+    display_ready = pyqtSignal(object)
 
     def __init__(self, ctx: AppContext):
         super().__init__()
@@ -17,44 +32,242 @@ class VideoCaptureThread(QThread):
         self.detect_face = False
         self.detect_user = False
 
-        self.f_detector = FaceDetection()
+        # With worker processes the models are only loaded in the workers
+        self.detection_pool = DetectionPool() if DETECTION_WORKERS > 0 else None
+        self.f_detector = FaceDetection(load_models=self.detection_pool is None)
+        self.f_detector.enable_roi_detection(ROI_DETECTION_ENABLED)
+        self.latest_detection = None
         self.u_repo = UserRepository(ctx)
-        self.user_list = self.u_repo.get_all()
+        # Enrolled users are decoded once, then patched by repository events
+        self.live_gallery = LiveFaceGallery.from_users(self.u_repo.get_all())
+        self.u_repo.subscribe(self._on_user_changed)
+
+        # Motion gate: skip detection and slow down while the scene is empty
+        self.motion_detector = MotionDetector() if MOTION_GATE_ENABLED else None
+        self.state = "active"
+        self.state_started = None
+        self.last_activity = None
+        self.state_time = {"active": 0.0, "idle": 0.0}
+        self.skipped_detections = 0
+
+        # Display frames are prepared here, off the GUI thread
+        self.display_size = None
+        self.display_pending = False
+        self.dropped_display_frames = 0
 
     def update_user_list(self):
-        self.user_list = self.u_repo.get_all()
+        """Reload every user; changes made through UserRepository apply on their own."""
+        self.live_gallery.load(self.u_repo.get_all())
+
+    def _on_user_changed(self, event: str, user):
+        """User listener, updates the gallery without blocking the preview."""
+        if event == "removed":
+            self.live_gallery.remove(user.id)
+        else:
+            self.live_gallery.add_user(user)
 
     def set_detect_face(self, detect_face: bool):
         self.detect_face = detect_face
 
     def set_detect_user(self, detect_user: bool):
         self.detect_user = detect_user
+        # Preview frames reuse the identity of tracked faces
+        self.f_detector.enable_tracking(detect_user)
+
+    def set_display_size(self, width: int, height: int):
+        """Size of the label the display frames are scaled to fit."""
+        self.display_size = (width, height)
+
+    def display_frame_consumed(self):
+        """Called by the GUI once a display frame is shown."""
+        self.display_pending = False
+
+    def prepare_display_frame(self, frame):
+        """Scale a BGR frame to fit the display size, keeping its aspect ratio."""
+        width, height = self.display_size
+        h, w = frame.shape[:2]
+        scale = min(width / w, height / h)
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        if size == (w, h):
+            return frame
+
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(frame, size, interpolation=interpolation)
+
+    def emit_display_frame(self, frame):
+        """Send a display frame unless the GUI has not shown the previous one."""
+        if self.display_size is None:
+            return
+        if self.display_pending:
+            self.dropped_display_frames += 1
+            metrics.increment("display_frames_dropped")
+            return
+
+        self.display_pending = True
+        with metrics.timed("display_prepare"):
+            display_frame = self.prepare_display_frame(frame)
+        self.display_ready.emit(display_frame)
 
     def track_user(self, frame):
         """Set the flags for face detection and user detection."""
+        if self.detection_pool is not None:
+            return self.track_user_in_pool(frame)
+
+        # The captured frame is only displayed, draw on it without a copy
         if self.detect_face:
-            frame, _ = self.f_detector.detect_faces(frame)
+            frame, _ = self.f_detector.detect_faces(frame, in_place=True)
         elif self.detect_user:
-            self.f_detector.detect_user(self.user_list)
-            frame, _ = self.f_detector.detect_faces(frame)
+            self.f_detector.use_gallery(self.live_gallery.snapshot)
+            frame, _ = self.f_detector.detect_faces(frame, in_place=True)
         return frame
 
+    def track_user_in_pool(self, frame):
+        """
+        Submit the frame to the detection workers and draw the latest result.
+
+        Results arrive a frame or two late, so the boxes drawn may lag slightly
+        behind fast movements.
+        """
+        if self.detect_user:
+            self.f_detector.use_gallery(self.live_gallery.snapshot)
+
+        self.detection_pool.submit(frame)
+        results = self.detection_pool.collect()
+        if results:
+            self.latest_detection = results[-1]
+
+        if self.latest_detection is None:
+            return frame
+        return self.f_detector.annotate(
+            frame,
+            self.latest_detection["faces"],
+            self.latest_detection["embeddings"],
+            in_place=True,
+        )
+
+    def _set_state(self, state: str, now: float):
+        """Switch between the 'active' and 'idle' states, accounting time."""
+        self.state_time[self.state] += now - self.state_started
+        self.state_started = now
+        if state != self.state:
+            print(f"INFO: Camera loop {self.state} -> {state}")
+            self.state = state
+
+    def should_detect(self, frame) -> bool:
+        """
+        Run the motion gate on a frame and update the duty-cycle state.
+
+        Detection is skipped when nothing moves and no face was present on the
+        last processed frame, so a person standing still keeps being tracked.
+        """
+        if self.motion_detector is None:
+            return True
+
+        now = time.monotonic()
+        motion = self.motion_detector.detect(frame)
+        face_present = len(self.f_detector.last_faces) > 0
+        if motion or face_present:
+            self.last_activity = now
+
+        if now - self.last_activity >= IDLE_AFTER_SECONDS:
+            self._set_state("idle", now)
+        else:
+            self._set_state("active", now)
+
+        if motion or face_present:
+            return True
+
+        self.skipped_detections += 1
+        metrics.increment("detections_skipped")
+        return False
+
+    def get_state_report(self):
+        """Time spent in each loop state and the number of skipped detections."""
+        report = {f"{state}_seconds": t for state, t in self.state_time.items()}
+        report["skipped_detections"] = self.skipped_detections
+        return report
+
     def run(self):
+        # Without worker processes this thread also detects and encodes
+        if self.detection_pool is None:
+            pin_thread("capture", "detection", "encoding")
+        else:
+            pin_thread("capture")
         self.capture = cv2.VideoCapture(0)
         if not self.capture.isOpened():
             print("Error: Could not open camera.")
             return
 
+        if self.detection_pool is not None:
+            self.detection_pool.start()
+
         self.running = True
+        self.state = "active"
+        self.state_started = self.last_activity = time.monotonic()
         while self.running:
-            ret, frame = self.capture.read()
-            frame = self.track_user(frame)
+            with metrics.timed("capture"):
+                ret, frame = self.capture.read()
             if ret:
-                self.frame_ready.emit(frame)
-            self.msleep(50)
+                metrics.increment("frames_captured")
+                with metrics.timed("frame"):
+                    detecting = self.detect_face or self.detect_user
+                    if detecting and self.should_detect(frame):
+                        frame = self.track_user(frame)
+                    self.frame_ready.emit(frame)
+                    self.emit_display_frame(frame)
+            else:
+                metrics.increment("capture_failures")
+
+            if self.state == "idle":
+                self.msleep(IDLE_FRAME_INTERVAL_MS)
+            else:
+                self.msleep(ACTIVE_FRAME_INTERVAL_MS)
+
+        self._set_state(self.state, time.monotonic())
+        if self.detection_pool is not None:
+            self.detection_pool.close()
 
     def stop(self):
+        self.u_repo.unsubscribe(self._on_user_changed)
         self.running = False
         self.wait()  # Wait for thread to finish
         if self.capture:
             self.capture.release()
+        if self.motion_detector is not None and self.state_started is not None:
+            report = self.get_state_report()
+            print(
+                f"INFO: Camera loop active {report['active_seconds']:.1f}s, "
+                f"idle {report['idle_seconds']:.1f}s, "
+                f"skipped detections: {report['skipped_detections']}"
+            )
+        if self.display_size is not None:
+            print(f"INFO: Display frames dropped: {self.dropped_display_frames}")
+        if self.detection_pool is not None:
+            print(
+                f"INFO: Frames dropped by the detection pool: "
+                f"{self.detection_pool.dropped_frames}"
+            )
+        quality_skipped = (
+            self.detection_pool.quality_skipped
+            if self.detection_pool is not None
+            else getattr(self.f_detector.quality_gate, "skipped", None)
+        )
+        if quality_skipped:
+            print(
+                "INFO: Faces skipped by the quality gate: "
+                + ", ".join(
+                    f"{reason} {count}" for reason, count in quality_skipped.items()
+                )
+            )
+        if isinstance(self.f_detector.face_detector, ROIFaceDetector):
+            stats = self.f_detector.face_detector.stats
+            print(
+                f"INFO: ROI hits: {stats['roi_hits']}, misses: {stats['roi_misses']}, "
+                f"full scans: {stats['full_scans']}"
+            )
+        if self.f_detector.tracker is not None:
+            stats = self.f_detector.tracker.stats
+            print(
+                f"INFO: Faces encoded: {stats['encoded']}, "
+                f"identities reused from tracks: {stats['reused']}"
+            )
@@ -1,11 +1,11 @@
 import sys
-import cv2
 from PyQt5.QtWidgets import (
     QMainWindow,
     QLabel,
     QWidget,
     QVBoxLayout,
     QStackedWidget,
+    QSizePolicy,
 )
 from PyQt5.QtGui import QImage, QPixmap
 from PyQt5.QtCore import Qt
@@ -58,6 +58,8 @@ class MainPage(QMainWindow):
         # Main Camera background
         self.camera_label = QLabel()
         self.camera_label.setAlignment(Qt.AlignCenter)
+        # Frames are scaled to the label, don't let them resize it
+        self.camera_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
         layout.addWidget(self.camera_label)
 
         # Center layout main container
@@ -97,7 +99,10 @@ class MainPage(QMainWindow):
         # Initialize video capture thread to prevent from blocking the UI
         self.video_thread = VideoCaptureThread(self.ctx)
         self.video_thread.set_detect_user(True)
-        self.video_thread.frame_ready.connect(self.update_frame)
+        self.video_thread.set_display_size(
+            self.camera_label.width(), self.camera_label.height()
+        )
+        self.video_thread.display_ready.connect(self.update_frame)
         self.video_thread.start()
 
     def center_buttons(self):
@@ -135,24 +140,23 @@ class MainPage(QMainWindow):
         self.load_main_menu()
 
     def update_frame(self, frame):
-        # Convert the image from BGR (OpenCV) to RGB (Qt)
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qt_image)
-
-        # Scale the pixmap to fit the label while maintaining aspect ratio
-        self.camera_label.setPixmap(
-            pixmap.scaled(
-                self.camera_label.size(),
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation,
+        # Frame arrives scaled to the label, wrap the BGR buffer without a copy
+        h, w = frame.shape[:2]
+        qt_image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
+        self.camera_label.setPixmap(QPixmap.fromImage(qt_image))
+        self.video_thread.display_frame_consumed()
+
+    def resizeEvent(self, event):
+        """Keep the display frames scaled to the camera label"""
+        super().resizeEvent(event)
+        if hasattr(self, "video_thread"):
+            self.video_thread.set_display_size(
+                self.camera_label.width(), self.camera_label.height()
             )
-        )
 
     def closeEvent(self, event):
         """Clean up when closing the application"""
-        self.timer.stop()
-        self.capture.release()
+        self.video_thread.stop()
+        # Child widgets get no closeEvent of their own
+        self.recognition_widget.cleanup()
         event.accept()
@@ -5,17 +5,21 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QLabel,
 )
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QTimer, pyqtSignal
 
 from thread import DetectFaceThread
 from controllers import FaceRecognitionController
 
 
 class RecognitionWidget(QWidget):
+    # Emitted with the user name when attendance is marked on any thread
+    attendance_marked = pyqtSignal(str)
+
     def __init__(self, parent=None, ctx=None):
         super().__init__(parent)
         self.ctx = ctx
         self.is_detecting = False
+        self.present_user_names = set()
         self.setup_ui()
         self.setup_timer()
         self.embedding = None
@@ -23,6 +27,11 @@ class RecognitionWidget(QWidget):
         self.controller = FaceRecognitionController(ctx)
         self.face_thread = None
 
+        # Load today's list once, then follow attendance change events
+        self.attendance_marked.connect(self.add_present_user)
+        self.update_user_list()
+        self.controller.subscribe_attendance(self._on_attendance_marked)
+
     def setup_ui(self):
         """Setup the UI for the Attendance Menu page"""
         self.main_layout = QVBoxLayout()
@@ -84,11 +93,23 @@ class RecognitionWidget(QWidget):
         self.setLayout(self.main_layout)
 
     def update_user_list(self):
-        """Update the user present list"""
-        self.name_list_widget.clear()
+        """Reload the whole user present list"""
+        self.clear_list()
         users = self.controller.get_users_preset_today()
         for user in users:
-            self.name_list_widget.addItem(user.user_name)
+            self.add_present_user(user.user_name)
+
+    def _on_attendance_marked(self, user, present: bool):
+        """Attendance listener, forwards the change to the GUI thread."""
+        if present:
+            self.attendance_marked.emit(user.user_name)
+
+    def add_present_user(self, name: str):
+        """Append a user to the present list unless already listed."""
+        if name in self.present_user_names:
+            return
+        self.present_user_names.add(name)
+        self.add_name_to_list(name)
 
     def set_face_detection(self, detection: bool):
         self.is_detecting = detection
@@ -101,11 +122,6 @@ class RecognitionWidget(QWidget):
         self.timer.timeout.connect(self.detect_face)
         self.timer.start(1000)
 
-        # Trigger user list update every 2 seconds
-        self.sync_attendance_timer = QTimer(self)
-        self.sync_attendance_timer.timeout.connect(self.update_user_list)
-        self.sync_attendance_timer.start(2000)  # 24 FPS
-
     def handle_thread(self, user_list):
         print("FOUND USER LIST", user_list)
         for user in user_list:
@@ -128,6 +144,17 @@ class RecognitionWidget(QWidget):
     def clear_list(self):
         """Clear the list UI."""
         self.name_list_widget.clear()
+        self.present_user_names.clear()
 
     def go_back_cb(self, cb):
         self.go_back_button.clicked.connect(cb)
+
+    def cleanup(self):
+        """Stop detecting and unsubscribe from attendance events."""
+        self.timer.stop()
+        self.set_face_detection(False)
+        self.controller.unsubscribe_attendance(self._on_attendance_marked)
+
+    def closeEvent(self, event):
+        self.cleanup()
+        super().closeEvent(event)